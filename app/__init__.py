@@ -32,8 +32,9 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
+    from app.search import include_object
     db.init_app(app)
-    migrate.init_app(app, db)
+    migrate.init_app(app, db, include_object=include_object)
     login.init_app(app)
     mail.init_app(app)
     moment.init_app(app)
@@ -43,6 +44,24 @@ def create_app(config_class=Config):
     app.redis = Redis.from_url(app.config['REDIS_URL'])
     app.task_queue = rq.Queue('microblog-tasks', connection=app.redis)
 
+    from app.search import create_search_backend
+    app.search_backend = create_search_backend(app)
+
+    from app.cache import create_cache
+    app.cache = create_cache(app)
+
+    from app.denylist import create_denylist
+    app.token_denylist = create_denylist(app)
+
+    from app.presence import create_presence
+    app.presence = create_presence(app)
+
+    from app.notifications import create_notification_store
+    app.notification_store = create_notification_store(app)
+
+    from app import sqlstats
+    sqlstats.init_app(app)
+
     from app.errors import bp as errors_bp
     app.register_blueprint(errors_bp)
 
@@ -14,6 +14,6 @@ def get_token():
 @bp.route('/tokens', methods=['DELETE'])
 @token_auth.login_required
 def revoke_token():
-    token_auth.current_user().revoke_token()
+    token_auth.current_user().revoke_token(token_auth.get_auth().token)
     db.session.commit()
     return '', 204
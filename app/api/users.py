@@ -5,6 +5,7 @@ from app.models import User
 from app.api import bp
 from app.api.auth import token_auth
 from app.api.errors import bad_request
+from app.presence import online_users
 
 
 @bp.route('/users/<int:id>', methods=['GET'])
@@ -16,19 +17,24 @@ def get_user(id):
 @bp.route('/users', methods=['GET'])
 @token_auth.login_required
 def get_users():
-    page = request.args.get('page', 1, type=int)
     per_page = min(request.args.get('per_page', 10, type=int), 100)
-    return User.to_collection_dict(sa.select(User), page, per_page,
+    return User.to_collection_dict(sa.select(User), per_page,
                                    'api.get_users')
 
 
+@bp.route('/users/online', methods=['GET'])
+@token_auth.login_required
+def get_online_users():
+    limit = min(request.args.get('limit', 100, type=int), 100)
+    return {'items': [user.to_dict() for user in online_users(limit)]}
+
+
 @bp.route('/users/<int:id>/followers', methods=['GET'])
 @token_auth.login_required
 def get_followers(id):
     user = db.get_or_404(User, id)
-    page = request.args.get('page', 1, type=int)
     per_page = min(request.args.get('per_page', 10, type=int), 100)
-    return User.to_collection_dict(user.followers.select(), page, per_page,
+    return User.to_collection_dict(user.followers.select(), per_page,
                                    'api.get_followers', id=id)
 
 
@@ -36,9 +42,8 @@ def get_followers(id):
 @token_auth.login_required
 def get_following(id):
     user = db.get_or_404(User, id)
-    page = request.args.get('page', 1, type=int)
     per_page = min(request.args.get('per_page', 10, type=int), 100)
-    return User.to_collection_dict(user.following.select(), page, per_page,
+    return User.to_collection_dict(user.following.select(), per_page,
                                    'api.get_following', id=id)
 
 
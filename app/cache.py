@@ -0,0 +1,171 @@
+from collections import OrderedDict
+import pickle
+from threading import Lock
+from time import time
+from flask import current_app
+import redis
+
+# Entries are stored together with the version that each of their tags had
+# when they were written. Invalidating a tag increments its version, which
+# turns all the entries that carry the tag into misses.
+#
+# Versions are forgotten tag_timeout seconds after their last increment, so
+# that they do not accumulate forever. Entries with tags never live longer
+# than that, so by the time a version goes back to 0 the entries that were
+# written with it have expired.
+
+
+class NullCache:
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout=None, tags=()):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def invalidate(self, *tags):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryCache:
+    def __init__(self, default_timeout=300, max_entries=10000,
+                 tag_timeout=86400):
+        self.default_timeout = default_timeout
+        self.max_entries = max_entries
+        self.tag_timeout = tag_timeout
+        self.lock = Lock()
+        self.entries = OrderedDict()
+        # ordered by the time of the last invalidation of each tag
+        self.versions = OrderedDict()
+
+    def _version(self, tag, now):
+        version, expires = self.versions.get(tag, (0, now))
+        return version if expires > now else 0
+
+    def get(self, key):
+        now = time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, versions, value = entry
+            if expires < now or any(
+                    self._version(tag, now) != version
+                    for tag, version in versions.items()):
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None, tags=()):
+        timeout = timeout or self.default_timeout
+        if tags:
+            timeout = min(timeout, self.tag_timeout)
+        now = time()
+        with self.lock:
+            versions = {tag: self._version(tag, now) for tag in tags}
+            self.entries[key] = (now + timeout, versions, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def invalidate(self, *tags):
+        now = time()
+        with self.lock:
+            for tag in tags:
+                self.versions[tag] = (self._version(tag, now) + 1,
+                                      now + self.tag_timeout)
+                self.versions.move_to_end(tag)
+            while self.versions and \
+                    next(iter(self.versions.values()))[1] <= now:
+                self.versions.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.versions.clear()
+
+
+class RedisCache:
+    prefix = 'cache:'
+    tag_prefix = 'cache-tag:'
+
+    def __init__(self, connection, default_timeout=300, tag_timeout=86400):
+        self.redis = connection
+        self.default_timeout = default_timeout
+        self.tag_timeout = tag_timeout
+
+    def _versions(self, tags):
+        versions = self.redis.mget([self.tag_prefix + tag for tag in tags])
+        return {tag: int(version or 0) for tag, version in zip(tags, versions)}
+
+    def get(self, key):
+        try:
+            entry = self.redis.get(self.prefix + key)
+            if entry is None:
+                return None
+            versions, value = pickle.loads(entry)
+            if versions and self._versions(list(versions)) != versions:
+                return None
+        except redis.exceptions.RedisError:
+            current_app.logger.exception('Cache get failed')
+            return None
+        return value
+
+    def set(self, key, value, timeout=None, tags=()):
+        timeout = timeout or self.default_timeout
+        if tags:
+            timeout = min(timeout, self.tag_timeout)
+        try:
+            versions = self._versions(list(tags)) if tags else {}
+            self.redis.set(self.prefix + key, pickle.dumps((versions, value)),
+                           ex=timeout)
+        except redis.exceptions.RedisError:
+            current_app.logger.exception('Cache set failed')
+
+    def delete(self, key):
+        try:
+            self.redis.delete(self.prefix + key)
+        except redis.exceptions.RedisError:
+            current_app.logger.exception('Cache delete failed')
+
+    def invalidate(self, *tags):
+        if not tags:
+            return
+        try:
+            pipe = self.redis.pipeline()
+            for tag in tags:
+                pipe.incr(self.tag_prefix + tag)
+                pipe.expire(self.tag_prefix + tag, self.tag_timeout)
+            pipe.execute()
+        except redis.exceptions.RedisError:
+            current_app.logger.exception('Cache invalidation failed')
+
+    def clear(self):
+        try:
+            for prefix in (self.prefix, self.tag_prefix):
+                keys = list(self.redis.scan_iter(prefix + '*'))
+                if keys:
+                    self.redis.delete(*keys)
+        except redis.exceptions.RedisError:
+            current_app.logger.exception('Cache clear failed')
+
+
+def create_cache(app):
+    if app.config['CACHE_TYPE'] == 'redis':
+        return RedisCache(app.redis, app.config['CACHE_DEFAULT_TIMEOUT'],
+                          app.config['CACHE_TAG_TIMEOUT'])
+    if app.config['CACHE_TYPE'] == 'memory':
+        return MemoryCache(app.config['CACHE_DEFAULT_TIMEOUT'],
+                           app.config['CACHE_MAX_ENTRIES'],
+                           app.config['CACHE_TAG_TIMEOUT'])
+    return NullCache()
@@ -1,6 +1,15 @@
+from datetime import datetime, time, timedelta, timezone
 import os
-from flask import Blueprint
+from flask import Blueprint, current_app
 import click
+import redis
+from app import db
+from app.models import User, Post
+from app.dump import TABLES, export_tables
+from app.languages import backfill_languages
+from app.maintenance import run_maintenance, schedule_maintenance
+from app.search import cache_stats
+from app.seed import seed_data
 
 bp = Blueprint('cli', __name__, cli_group=None)
 
@@ -38,3 +47,172 @@ def compile():
     """Compile all languages."""
     if os.system('pybabel compile -d app/translations'):
         raise RuntimeError('compile command failed')
+
+
+@bp.cli.group()
+def timeline():
+    """Home timeline maintenance commands."""
+    pass
+
+
+@timeline.command()
+def rebuild():
+    """Rebuild the home timeline of all users."""
+    User.rebuild_timelines()
+    db.session.commit()
+
+
+@bp.cli.group()
+def counters():
+    """Denormalized counter commands."""
+    pass
+
+
+@counters.command()
+def reconcile():
+    """Recompute the follower, post and unread message counters."""
+    User.reconcile_counters()
+    db.session.commit()
+    current_app.cache.clear()
+
+
+@bp.cli.group()
+def search():
+    """Search index commands."""
+    pass
+
+
+@search.command()
+@click.option('--workers', default=1, help='Number of worker processes.')
+@click.option('--batch-size', default=1000, help='Documents per bulk request.')
+@click.option('--resume', is_flag=True,
+              help='Continue an interrupted reindex from its checkpoint.')
+def reindex(workers, batch_size, resume):
+    """Rebuild the search index of posts."""
+    count = Post.reindex(workers=workers, batch_size=batch_size,
+                         resume=resume)
+    click.echo(f'Indexed {count} posts.')
+
+
+@search.command()
+def stats():
+    """Show the hit rate of the search result cache."""
+    if current_app.config['CACHE_TYPE'] != 'redis':
+        raise click.ClickException(
+            'Statistics are only kept when CACHE_TYPE is redis.')
+    try:
+        stats = cache_stats()
+    except redis.exceptions.RedisError as exc:
+        raise click.ClickException(f'Could not read the statistics: {exc}')
+    click.echo('Hits: {hits}, misses: {misses}, refreshes: {refreshes}, '
+               'hit rate: {hit_rate:.1%}'.format(**stats))
+
+
+@bp.cli.group()
+def posts():
+    """Post maintenance commands."""
+    pass
+
+
+@posts.command('detect-languages')
+@click.option('--workers', default=1, help='Number of worker processes.')
+@click.option('--batch-size', default=1000, help='Posts per transaction.')
+def detect_languages(workers, batch_size):
+    """Detect the language of posts that do not have one."""
+    count = backfill_languages(workers=workers, batch_size=batch_size)
+    click.echo(f'Detected the language of {count} posts.')
+
+
+@bp.cli.group()
+def maintenance():
+    """Database maintenance commands."""
+    pass
+
+
+@maintenance.command()
+def run():
+    """Delete expired notifications and finished tasks."""
+    removed = run_maintenance()
+    click.echo('Removed {notifications} notifications and {tasks} '
+               'tasks.'.format(**removed))
+
+
+@maintenance.command()
+def schedule():
+    """Start running the maintenance job periodically in the worker."""
+    try:
+        job = schedule_maintenance(delay=0)
+    except redis.exceptions.RedisError as exc:
+        raise click.ClickException(f'Could not schedule the job: {exc}')
+    if job is None:
+        click.echo('Maintenance job is already scheduled.')
+    else:
+        click.echo('Maintenance job scheduled.')
+
+
+@bp.cli.group()
+def data():
+    """Bulk data commands."""
+    pass
+
+
+@data.command('export')
+@click.argument('directory')
+@click.option('--table', 'tables', multiple=True,
+              type=click.Choice(list(TABLES)),
+              help='Table to export, all of them by default.')
+@click.option('--format', default='ndjson',
+              type=click.Choice(['ndjson', 'csv']), help='Output format.')
+@click.option('--workers', default=1, help='Number of worker processes.')
+@click.option('--shards', type=int,
+              help='Shards per table, the number of workers by default.')
+@click.option('--batch-size', default=10000, help='Rows fetched at a time.')
+@click.option('--resume', is_flag=True,
+              help='Export only the shards missing from the manifest.')
+def export_data(directory, tables, format, workers, shards, batch_size,
+                resume):
+    """Dump tables as compressed shards with a manifest."""
+    manifest = export_tables(directory, tables=list(tables) or None,
+                             format=format, workers=workers, shards=shards,
+                             batch_size=batch_size, resume=resume)
+    for name, table_shards in manifest['tables'].items():
+        click.echo('{}: {} rows in {} shards'.format(
+            name, sum(shard['rows'] for shard in table_shards),
+            len(table_shards)))
+
+
+@bp.cli.command()
+@click.option('--users', default=1000, help='Number of users.')
+@click.option('--posts', default=10000, help='Number of posts.')
+@click.option('--messages', default=1000, help='Number of private messages.')
+@click.option('--follows', default=20,
+              help='Average number of users that each user follows.')
+@click.option('--alpha', default=1.0,
+              help='Exponent of the power law of the follower counts.')
+@click.option('--days', default=365, help='Days of activity to generate.')
+@click.option('--until', type=click.DateTime(),
+              help='End of the activity, today at midnight UTC by default.')
+@click.option('--seed', 'random_seed', default=0, help='Random seed.')
+@click.option('--batch-size', default=1000, help='Rows per insert statement.')
+@click.option('--password', default='password',
+              help='Password of all the generated users.')
+def seed(users, posts, messages, follows, alpha, days, until, random_seed,
+         batch_size, password):
+    """Generate a synthetic dataset for load testing."""
+    if until is None:
+        until = datetime.combine(datetime.now(timezone.utc).date(), time())
+    try:
+        counts = seed_data(users, posts, messages, follows, alpha,
+                           until - timedelta(days=days), until,
+                           seed=random_seed, batch_size=batch_size,
+                           password=password)
+    except ValueError as exc:
+        raise click.ClickException(str(exc))
+    click.echo('Inserted {users} users, {follows} follows, {posts} posts '
+               'and {messages} messages.'.format(**counts))
+    User.rebuild_timelines()
+    User.reconcile_counters()
+    db.session.commit()
+    current_app.cache.clear()
+    Post.reindex()
+    click.echo('Rebuilt timelines, counters and the search index.')
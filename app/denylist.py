@@ -0,0 +1,45 @@
+from threading import Lock
+from time import time
+
+
+class MemoryDenylist:
+    def __init__(self):
+        self.lock = Lock()
+        self.entries = {}
+
+    def add(self, token_id, expires_at):
+        now = time()
+        with self.lock:
+            self.entries = {id: exp for id, exp in self.entries.items()
+                            if exp > now}
+            self.entries[token_id] = expires_at
+
+    def __contains__(self, token_id):
+        with self.lock:
+            expires_at = self.entries.get(token_id)
+        return expires_at is not None and expires_at > time()
+
+
+class RedisDenylist:
+    prefix = 'token-denylist:'
+
+    def __init__(self, connection):
+        self.redis = connection
+
+    def add(self, token_id, expires_at):
+        # entries only need to outlive the token they revoke
+        self.redis.set(self.prefix + token_id, 1,
+                       exat=max(int(expires_at) + 1, int(time()) + 1))
+
+    def __contains__(self, token_id):
+        return bool(self.redis.exists(self.prefix + token_id))
+
+
+def create_denylist(app):
+    if app.config['TOKEN_DENYLIST_BACKEND'] == 'redis':
+        return RedisDenylist(app.redis)
+    # a token revoked in one process would still be accepted by the others
+    if not app.debug and not app.testing:
+        raise RuntimeError('The memory token denylist cannot be used in '
+                           'production, set TOKEN_DENYLIST_BACKEND=redis')
+    return MemoryDenylist()
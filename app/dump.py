@@ -0,0 +1,105 @@
+import csv
+from datetime import datetime, timezone
+import gzip
+import json
+import os
+import sqlalchemy as sa
+from app import db
+from app.models import User, Post, Message, followers
+from app.parallel import iter_parallel, key_ranges
+
+TABLES = {table.name: table for table in [
+    User.__table__, Post.__table__, followers, Message.__table__]}
+# credentials are never part of a dump
+EXCLUDED_COLUMNS = {'user': {'password_hash', 'token', 'token_expiration'}}
+MANIFEST = 'manifest.json'
+
+
+def _columns(table):
+    excluded = EXCLUDED_COLUMNS.get(table.name, set())
+    return [column for column in table.columns if column.name not in excluded]
+
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def dump_shard(directory, filename, table_name, start, end, format,
+               batch_size):
+    # the shard is written under a temporary name and renamed when it is
+    # complete, so a file with the final name is never partial
+    table = TABLES[table_name]
+    columns = _columns(table)
+    key = table.primary_key.columns.values()[0]
+    query = sa.select(*columns).where(key >= start, key < end).order_by(
+        *table.primary_key.columns)
+    path = os.path.join(directory, filename)
+    rows = 0
+    with db.engine.connect() as connection:
+        result = connection.execution_options(yield_per=batch_size).execute(
+            query)
+        with gzip.open(path + '.tmp', 'wt', encoding='utf-8',
+                       newline='') as f:
+            if format == 'csv':
+                writer = csv.writer(f)
+                writer.writerow([column.name for column in columns])
+                for row in result:
+                    writer.writerow([_value(value) for value in row])
+                    rows += 1
+            else:
+                names = [column.name for column in columns]
+                for row in result:
+                    f.write(json.dumps(dict(zip(
+                        names, [_value(value) for value in row]))) + '\n')
+                    rows += 1
+    os.replace(path + '.tmp', path)
+    return filename, rows
+
+
+def _plan(tables, shards, format):
+    manifest = {'format': format,
+                'created': datetime.now(timezone.utc).isoformat(),
+                'complete': False, 'tables': {}}
+    for name in tables:
+        table = TABLES[name]
+        key = table.primary_key.columns.values()[0]
+        manifest['tables'][name] = [
+            {'file': f'{name}-{i:04d}.{format}.gz', 'key': key.name,
+             'start': start, 'end': end, 'rows': None}
+            for i, (start, end) in enumerate(key_ranges(key, shards))]
+    return manifest
+
+
+def _write_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(path + '.tmp', path)
+
+
+def export_tables(directory, tables=None, format='ndjson', workers=1,
+                  shards=None, batch_size=10000, resume=False):
+    # the manifest lists the shards of each table with their key ranges and
+    # is updated as each shard completes, so that an interrupted export can
+    # be resumed by running only the shards that have no row count yet
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, MANIFEST)
+    if resume and os.path.exists(path):
+        with open(path) as f:
+            manifest = json.load(f)
+    else:
+        manifest = _plan(tables or TABLES, shards or workers, format)
+        _write_manifest(directory, manifest)
+    shards_by_file = {shard['file']: shard
+                      for table_shards in manifest['tables'].values()
+                      for shard in table_shards}
+    tasks = [(directory, shard['file'], name, shard['start'], shard['end'],
+              manifest['format'], batch_size)
+             for name, table_shards in manifest['tables'].items()
+             for shard in table_shards if shard['rows'] is None]
+    for filename, rows in iter_parallel(dump_shard, tasks, workers):
+        shards_by_file[filename]['rows'] = rows
+        _write_manifest(directory, manifest)
+    manifest['complete'] = True
+    _write_manifest(directory, manifest)
+    return manifest
@@ -0,0 +1,56 @@
+import json
+import operator
+from time import monotonic
+import sqlalchemy as sa
+from app import db
+from app.models import Post
+from app.pagination import keyset_filter
+
+
+def post_rows(user_id, batch_size=1000):
+    # rows are read in short keyset queries instead of through one long
+    # lived cursor, so that memory use does not grow with the number of
+    # posts and the session can be committed while the rows are consumed
+    columns = (Post.timestamp, Post.id)
+    query = sa.select(Post.body, Post.timestamp, Post.id).where(
+        Post.user_id == user_id).order_by(*columns).limit(batch_size)
+    last = None
+    while True:
+        batch_query = query
+        if last is not None:
+            batch_query = query.where(keyset_filter(columns, last,
+                                                    operator.gt))
+        rows = db.session.execute(batch_query).all()
+        for body, timestamp, id in rows:
+            yield {'body': body, 'timestamp': timestamp.isoformat() + 'Z'}
+        if len(rows) < batch_size:
+            break
+        last = (rows[-1].timestamp, rows[-1].id)
+
+
+def json_chunks(rows):
+    yield '{"posts": ['
+    separator = '\n    '
+    for row in rows:
+        yield separator + json.dumps(row)
+        separator = ',\n    '
+    yield '\n]}\n'
+
+
+def ndjson_chunks(rows):
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+
+def report_progress(rows, total, callback, interval=1.0):
+    # callback receives the completed percentage, at most once per interval
+    # and only when it changes, and never 100, which is left to the caller
+    reported = 0
+    last = monotonic()
+    for i, row in enumerate(rows, 1):
+        yield row
+        percent = min(100 * i // total, 99) if total else 0
+        if percent > reported and monotonic() - last >= interval:
+            callback(percent)
+            reported = percent
+            last = monotonic()
@@ -0,0 +1,87 @@
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+from flask import current_app
+from langdetect import LangDetectException, detect, detector_factory
+import redis
+from app import db
+from app.models import Post
+from app.parallel import id_ranges, run_parallel
+from app.search import bump_generation
+
+
+def load_profiles():
+    # langdetect reads its language profiles on first use, which is slow, so
+    # worker processes do it once when they start
+    detector_factory.init_factory()
+
+
+def detect_language(text):
+    try:
+        return detect(text)
+    except LangDetectException:
+        return ''
+
+
+def queue_detection(ids):
+    try:
+        current_app.task_queue.enqueue('app.tasks.detect_languages', ids)
+    except redis.exceptions.RedisError:
+        # the posts are picked up by flask posts detect-languages
+        current_app.logger.exception('Could not queue language detection')
+
+
+def _update_languages(rows):
+    if not rows:
+        return
+    post_table = Post.__table__
+    db.session.execute(
+        sa.update(post_table)
+        .where(post_table.c.id == sa.bindparam('post_id'))
+        .values(language=sa.bindparam('detected')),
+        [{'post_id': id, 'detected': detect_language(body)}
+         for id, body in rows])
+    db.session.commit()
+    _refresh_posts([id for id, body in rows])
+
+
+def _refresh_posts(ids):
+    # the update bypasses the session events, so the search documents and
+    # the cached copies of the posts are refreshed here
+    posts = db.session.scalars(sa.select(Post).where(Post.id.in_(ids))
+                               .options(so.selectinload(Post.author))).all()
+    current_app.search_backend.commit(
+        [(Post.__tablename__, post, 'index') for post in posts])
+    bump_generation(Post.__tablename__)
+    current_app.cache.invalidate(
+        *{tag for post in posts for tag in post.cache_tags()})
+    db.session.rollback()
+
+
+def detect_post_languages(ids):
+    _update_languages(db.session.execute(
+        sa.select(Post.id, Post.body).where(Post.id.in_(ids))).all())
+
+
+def detect_range(start, end, batch_size):
+    load_profiles()
+    count = 0
+    last_id = start - 1
+    while True:
+        rows = db.session.execute(
+            sa.select(Post.id, Post.body)
+            .where(Post.id > last_id, Post.id < end,
+                   sa.or_(Post.language.is_(None), Post.language == ''))
+            .order_by(Post.id).limit(batch_size)).all()
+        if not rows:
+            break
+        _update_languages(rows)
+        last_id = rows[-1].id
+        count += len(rows)
+    return count
+
+
+def backfill_languages(workers=1, batch_size=1000):
+    counts = run_parallel(detect_range, [
+        (start, end, batch_size) for start, end in id_ranges(Post, workers)],
+        workers)
+    return sum(counts)
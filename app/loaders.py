@@ -0,0 +1,28 @@
+import sqlalchemy as sa
+from flask import g
+from app import db
+from app.models import User
+
+
+def _loaded(kind):
+    if 'loaded' not in g:
+        g.loaded = {}
+    return g.loaded.setdefault(kind, {})
+
+
+def load_users(ids):
+    # users are kept in a request-scoped cache, which also keeps them alive
+    # in the session identity map, so that lazy loads of many-to-one
+    # relationships to these users are resolved without a query
+    users = _loaded('user')
+    missing = set(ids) - users.keys()
+    if missing:
+        for user in db.session.scalars(
+                sa.select(User).where(User.id.in_(missing))):
+            users[user.id] = user
+    return {id: users.get(id) for id in ids}
+
+
+def load_authors(items, attr='user_id'):
+    load_users({getattr(item, attr) for item in items})
+    return items
@@ -1,23 +1,26 @@
-from datetime import datetime, timezone
 from flask import render_template, flash, redirect, url_for, request, g, \
-    current_app
+    abort, current_app, Response, stream_with_context
 from flask_login import current_user, login_required
 from flask_babel import _, get_locale
 import sqlalchemy as sa
-from langdetect import detect, LangDetectException
+import redis
 from app import db
 from app.main.forms import EditProfileForm, EmptyForm, PostForm, SearchForm, \
     MessageForm
-from app.models import User, Post, Message, Notification
-from app.translate import translate
+from app.models import User, Post, Message, timeline
+from app.pagination import paginate
+from app.export import json_chunks, ndjson_chunks, post_rows
+from app.loaders import load_authors
+from app.notifications import event_stream, notifications_since, subscribe
+from app.presence import record_activity, is_online
+from app.translate import translate, translate_batch
 from app.main import bp
 
 
 @bp.before_app_request
 def before_request():
     if current_user.is_authenticated:
-        current_user.last_seen = datetime.now(timezone.utc)
-        db.session.commit()
+        record_activity(current_user)
         g.search_form = SearchForm()
     g.locale = str(get_locale())
 
@@ -28,43 +31,36 @@ def before_request():
 def index():
     form = PostForm()
     if form.validate_on_submit():
-        try:
-            language = detect(form.post.data)
-        except LangDetectException:
-            language = ''
-        post = Post(body=form.post.data, author=current_user,
-                    language=language)
+        post = Post(body=form.post.data, author=current_user)
         db.session.add(post)
         db.session.commit()
         flash(_('Your post is now live!'))
         return redirect(url_for('main.index'))
-    page = request.args.get('page', 1, type=int)
-    posts = db.paginate(current_user.following_posts(), page=page,
-                        per_page=current_app.config['POSTS_PER_PAGE'],
-                        error_out=False)
-    next_url = url_for('main.index', page=posts.next_num) \
+    posts = paginate(current_user.following_posts(),
+                     (timeline.c.timestamp, timeline.c.post_id),
+                     current_app.config['POSTS_PER_PAGE'],
+                     key=lambda post: (post.timestamp, post.id))
+    next_url = url_for('main.index', **posts.next_args) \
         if posts.has_next else None
-    prev_url = url_for('main.index', page=posts.prev_num) \
+    prev_url = url_for('main.index', **posts.prev_args) \
         if posts.has_prev else None
     return render_template('index.html', title=_('Home'), form=form,
-                           posts=posts.items, next_url=next_url,
+                           posts=load_authors(posts.items), next_url=next_url,
                            prev_url=prev_url)
 
 
 @bp.route('/explore')
 @login_required
 def explore():
-    page = request.args.get('page', 1, type=int)
     query = sa.select(Post).order_by(Post.timestamp.desc())
-    posts = db.paginate(query, page=page,
-                        per_page=current_app.config['POSTS_PER_PAGE'],
-                        error_out=False)
-    next_url = url_for('main.explore', page=posts.next_num) \
+    posts = paginate(query, (Post.timestamp, Post.id),
+                     current_app.config['POSTS_PER_PAGE'])
+    next_url = url_for('main.explore', **posts.next_args) \
         if posts.has_next else None
-    prev_url = url_for('main.explore', page=posts.prev_num) \
+    prev_url = url_for('main.explore', **posts.prev_args) \
         if posts.has_prev else None
     return render_template('index.html', title=_('Explore'),
-                           posts=posts.items, next_url=next_url,
+                           posts=load_authors(posts.items), next_url=next_url,
                            prev_url=prev_url)
 
 
@@ -72,18 +68,17 @@ def explore():
 @login_required
 def user(username):
     user = db.first_or_404(sa.select(User).where(User.username == username))
-    page = request.args.get('page', 1, type=int)
     query = user.posts.select().order_by(Post.timestamp.desc())
-    posts = db.paginate(query, page=page,
-                        per_page=current_app.config['POSTS_PER_PAGE'],
-                        error_out=False)
+    posts = paginate(query, (Post.timestamp, Post.id),
+                     current_app.config['POSTS_PER_PAGE'])
     next_url = url_for('main.user', username=user.username,
-                       page=posts.next_num) if posts.has_next else None
+                       **posts.next_args) if posts.has_next else None
     prev_url = url_for('main.user', username=user.username,
-                       page=posts.prev_num) if posts.has_prev else None
+                       **posts.prev_args) if posts.has_prev else None
     form = EmptyForm()
     return render_template('user.html', user=user, posts=posts.items,
-                           next_url=next_url, prev_url=prev_url, form=form)
+                           next_url=next_url, prev_url=prev_url, form=form,
+                           online=is_online(user))
 
 
 @bp.route('/user/<username>/popup')
@@ -162,11 +157,47 @@ def translate_text():
                               data['dest_language'])}
 
 
+@bp.route('/translate/batch', methods=['POST'])
+@login_required
+def translate_batch_texts():
+    data = request.get_json(silent=True)
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list) or \
+            len(items) > current_app.config['TRANSLATE_BATCH_MAX_ITEMS'] or \
+            not all(isinstance(item, dict) and
+                    isinstance(item.get('text'), str) and
+                    isinstance(item.get('source'), str) and
+                    isinstance(item.get('dest'), str) and
+                    isinstance(item.get('id'), (int, str))
+                    for item in items):
+        abort(400)
+    translations, errors = translate_batch(items)
+    return {'translations': [{'id': id, 'text': text}
+                             for id, text in translations.items()],
+            'errors': [{'id': id, 'error': error}
+                       for id, error in errors.items()]}
+
+
 @bp.route('/search')
 @login_required
 def search():
     if not g.search_form.validate():
         return redirect(url_for('main.explore'))
+    if current_app.search_backend.stores_documents:
+        try:
+            posts = Post.search_page(g.search_form.q.data,
+                                     current_app.config['POSTS_PER_PAGE'],
+                                     before=request.args.get('before'),
+                                     after=request.args.get('after'))
+        except ValueError:
+            abort(400)
+        next_url = url_for('main.search', q=g.search_form.q.data,
+                           **posts.next_args) if posts.has_next else None
+        prev_url = url_for('main.search', q=g.search_form.q.data,
+                           **posts.prev_args) if posts.has_prev else None
+        return render_template('search.html', title=_('Search'),
+                               posts=posts.items, next_url=next_url,
+                               prev_url=prev_url)
     page = request.args.get('page', 1, type=int)
     posts, total = Post.search(g.search_form.q.data, page,
                                current_app.config['POSTS_PER_PAGE'])
@@ -174,7 +205,8 @@ def search():
         if total > page * current_app.config['POSTS_PER_PAGE'] else None
     prev_url = url_for('main.search', q=g.search_form.q.data, page=page - 1) \
         if page > 1 else None
-    return render_template('search.html', title=_('Search'), posts=posts,
+    return render_template('search.html', title=_('Search'),
+                           posts=load_authors(list(posts)),
                            next_url=next_url, prev_url=prev_url)
 
 
@@ -187,6 +219,7 @@ def send_message(recipient):
         msg = Message(author=current_user, recipient=user,
                       body=form.message.data)
         db.session.add(msg)
+        db.session.flush()
         user.add_notification('unread_message_count',
                               user.unread_message_count())
         db.session.commit()
@@ -199,20 +232,19 @@ def send_message(recipient):
 @bp.route('/messages')
 @login_required
 def messages():
-    current_user.last_message_read_time = datetime.now(timezone.utc)
+    current_user.mark_messages_read()
     current_user.add_notification('unread_message_count', 0)
     db.session.commit()
-    page = request.args.get('page', 1, type=int)
     query = current_user.messages_received.select().order_by(
         Message.timestamp.desc())
-    messages = db.paginate(query, page=page,
-                           per_page=current_app.config['POSTS_PER_PAGE'],
-                           error_out=False)
-    next_url = url_for('main.messages', page=messages.next_num) \
+    messages = paginate(query, (Message.timestamp, Message.id),
+                        current_app.config['POSTS_PER_PAGE'])
+    next_url = url_for('main.messages', **messages.next_args) \
         if messages.has_next else None
-    prev_url = url_for('main.messages', page=messages.prev_num) \
+    prev_url = url_for('main.messages', **messages.prev_args) \
         if messages.has_prev else None
-    return render_template('messages.html', messages=messages.items,
+    return render_template('messages.html',
+                           messages=load_authors(messages.items, 'sender_id'),
                            next_url=next_url, prev_url=prev_url)
 
 
@@ -227,15 +259,45 @@ def export_posts():
     return redirect(url_for('main.user', username=current_user.username))
 
 
+@bp.route('/export_posts/download')
+@login_required
+def download_posts():
+    format = request.args.get('format', 'json')
+    if format not in ('json', 'ndjson'):
+        abort(400)
+    rows = post_rows(current_user.id, current_app.config['EXPORT_BATCH_SIZE'])
+    if format == 'ndjson':
+        chunks, mimetype = ndjson_chunks(rows), 'application/x-ndjson'
+    else:
+        chunks, mimetype = json_chunks(rows), 'application/json'
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename=posts.{format}'})
+
+
 @bp.route('/notifications')
 @login_required
 def notifications():
     since = request.args.get('since', 0.0, type=float)
-    query = current_user.notifications.select().where(
-        Notification.timestamp > since).order_by(Notification.timestamp.asc())
-    notifications = db.session.scalars(query)
-    return [{
-        'name': n.name,
-        'data': n.get_data(),
-        'timestamp': n.timestamp
-    } for n in notifications]
+    return notifications_since(current_user, since)
+
+
+@bp.route('/notifications/stream')
+@login_required
+def notification_stream():
+    if not current_app.config['NOTIFICATION_STREAM']:
+        abort(404)
+    since = request.headers.get('Last-Event-ID', type=float) or \
+        request.args.get('since', 0.0, type=float)
+    try:
+        pubsub = subscribe(current_user.id)
+    except redis.exceptions.RedisError:
+        abort(503)
+    # subscribing first means that nothing is lost between the query for
+    # the missed notifications and the start of the stream
+    backlog = notifications_since(current_user, since)
+    return Response(
+        event_stream(pubsub, backlog,
+                     current_app.config['NOTIFICATION_STREAM_TIMEOUT'],
+                     current_app.config['NOTIFICATION_STREAM_KEEPALIVE']),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta, timezone
+from time import time
+from uuid import uuid4
+import sqlalchemy as sa
+from flask import current_app
+from app import db
+from app.models import Notification, Task
+
+JOB_PREFIX = 'maintenance-'
+
+
+def _delete_in_batches(model, key, condition, batch_size):
+    # each batch is its own short transaction, so that the deletes never
+    # hold locks on a large part of the table
+    count = 0
+    while True:
+        keys = db.session.scalars(
+            sa.select(key).where(condition).limit(batch_size)).all()
+        if not keys:
+            break
+        db.session.execute(sa.delete(model).where(key.in_(keys)))
+        db.session.commit()
+        count += len(keys)
+    return count
+
+
+def expire_notifications(batch_size):
+    retention = current_app.config['NOTIFICATION_RETENTION']
+    now = time()
+    count = 0
+    for name, seconds in retention.items():
+        count += _delete_in_batches(
+            Notification, Notification.id,
+            sa.and_(Notification.name == name,
+                    Notification.timestamp < now - seconds), batch_size)
+    count += _delete_in_batches(
+        Notification, Notification.id,
+        sa.and_(Notification.name.not_in(list(retention)),
+                Notification.timestamp < now -
+                current_app.config['NOTIFICATION_RETENTION_DEFAULT']),
+        batch_size)
+    return count
+
+
+def expire_tasks(batch_size):
+    cutoff = datetime.now(timezone.utc) - timedelta(
+        seconds=current_app.config['TASK_RETENTION'])
+    return _delete_in_batches(
+        Task, Task.id, sa.and_(Task.complete == True,
+                               Task.completed_at < cutoff), batch_size)
+
+
+def run_maintenance():
+    batch_size = current_app.config['MAINTENANCE_BATCH_SIZE']
+    removed = {'notifications': expire_notifications(batch_size),
+               'tasks': expire_tasks(batch_size)}
+    current_app.logger.info('Maintenance removed %d notifications and %d '
+                            'tasks', removed['notifications'],
+                            removed['tasks'])
+    return removed
+
+
+def scheduled_maintenance():
+    return [job_id for job_id in
+            current_app.task_queue.scheduled_job_registry.get_job_ids()
+            if job_id.startswith(JOB_PREFIX)]
+
+
+def schedule_maintenance(delay=None):
+    # every run gets its own job id, because rq expires the key of a job
+    # once it finishes, and a next run saved under the same id would be
+    # expired with it
+    if scheduled_maintenance():
+        return None
+    return current_app.task_queue.enqueue_in(
+        timedelta(seconds=current_app.config['MAINTENANCE_INTERVAL']
+                  if delay is None else delay),
+        'app.tasks.run_maintenance', job_id=JOB_PREFIX + uuid4().hex)
@@ -1,19 +1,21 @@
 from datetime import datetime, timezone, timedelta
 from hashlib import md5
+from itertools import chain
 import json
 import secrets
 from time import time
 from typing import Optional
 import sqlalchemy as sa
 import sqlalchemy.orm as so
-from flask import current_app, url_for
+from flask import current_app, request, url_for
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 import redis
 import rq
 from app import db, login
-from app.search import add_to_index, remove_from_index, query_index
+from app.search import query_index, bump_generation, register_fulltext
+from app.pagination import paginate
 
 
 class SearchableMixin:
@@ -29,59 +31,144 @@ class SearchableMixin:
             db.case(*when, value=cls.id))
         return db.session.scalars(query), total
 
+    @classmethod
+    def search_page(cls, expression, per_page, before=None, after=None):
+        page = current_app.search_backend.query_documents(
+            cls.__tablename__, expression, per_page, before=before,
+            after=after)
+        page.items = [cls.from_search_document(document)
+                      for document in page.items]
+        return page
+
     @classmethod
     def before_commit(cls, session):
+        dependents = []
+        for obj in session.dirty:
+            if hasattr(obj, 'search_dependents'):
+                dependents.extend(obj.search_dependents())
         session._changes = {
             'add': list(session.new),
-            'update': list(session.dirty),
+            'update': list(session.dirty) + dependents,
             'delete': list(session.deleted)
         }
 
     @classmethod
     def after_commit(cls, session):
+        changes = []
         for obj in session._changes['add']:
             if isinstance(obj, SearchableMixin):
-                add_to_index(obj.__tablename__, obj)
+                changes.append((obj.__tablename__, obj, 'index'))
         for obj in session._changes['update']:
             if isinstance(obj, SearchableMixin):
-                add_to_index(obj.__tablename__, obj)
+                changes.append((obj.__tablename__, obj, 'index'))
         for obj in session._changes['delete']:
             if isinstance(obj, SearchableMixin):
-                remove_from_index(obj.__tablename__, obj)
+                changes.append((obj.__tablename__, obj, 'delete'))
         session._changes = None
+        current_app.search_backend.commit(changes)
+        if changes:
+            bump_generation(*{index for index, obj, op in changes})
+
+    @classmethod
+    def after_flush(cls, session, flush_context):
+        # backends that live in the database are updated in the same
+        # transaction as the rows they index
+        changes = []
+        for obj in chain(session.new, session.dirty):
+            if isinstance(obj, SearchableMixin):
+                changes.append((obj.__tablename__, obj, 'index'))
+        for obj in session.deleted:
+            if isinstance(obj, SearchableMixin):
+                changes.append((obj.__tablename__, obj, 'delete'))
+        if changes:
+            current_app.search_backend.sync(session.connection(), changes)
 
     @classmethod
-    def reindex(cls):
-        for obj in db.session.scalars(sa.select(cls)):
-            add_to_index(cls.__tablename__, obj)
+    def reindex(cls, workers=1, batch_size=1000, resume=False):
+        count = current_app.search_backend.rebuild(
+            cls, workers=workers, batch_size=batch_size, resume=resume)
+        bump_generation(cls.__tablename__)
+        return count
 
 
 db.event.listen(db.session, 'before_commit', SearchableMixin.before_commit)
+db.event.listen(db.session, 'after_flush', SearchableMixin.after_flush)
 db.event.listen(db.session, 'after_commit', SearchableMixin.after_commit)
 
 
-class PaginatedAPIMixin(object):
+class CacheableMixin:
+    def cache_tags(self):
+        return ['{}:{}'.format(self.__tablename__, self.id)]
+
     @staticmethod
-    def to_collection_dict(query, page, per_page, endpoint, **kwargs):
-        resources = db.paginate(query, page=page, per_page=per_page,
-                                error_out=False)
+    def invalidate_on_commit(session, *tags):
+        session.info.setdefault('cache_tags', set()).update(tags)
+
+    @classmethod
+    def after_flush(cls, session, flush_context):
+        tags = set()
+        for obj in chain(session.new, session.dirty, session.deleted):
+            if isinstance(obj, CacheableMixin):
+                tags.update(obj.cache_tags())
+        if tags:
+            cls.invalidate_on_commit(session, *tags)
+
+    @classmethod
+    def after_commit(cls, session):
+        tags = session.info.pop('cache_tags', None)
+        if tags:
+            current_app.cache.invalidate(*tags)
+
+    @classmethod
+    def after_rollback(cls, session):
+        session.info.pop('cache_tags', None)
+
+
+db.event.listen(db.session, 'after_flush', CacheableMixin.after_flush)
+db.event.listen(db.session, 'after_commit', CacheableMixin.after_commit)
+db.event.listen(db.session, 'after_rollback', CacheableMixin.after_rollback)
+
+
+class PaginatedAPIMixin(object):
+    @classmethod
+    def to_collection_dict(cls, query, per_page, endpoint, **kwargs):
+        # collections are in id order as they were before cursors were
+        # added, and the first page reports the totals, so that clients that
+        # do not send a page number see the same response as before. Pages
+        # requested with a cursor are not counted
+        resources = paginate(query, (cls.id,), per_page, descending=False)
+        cursor = {arg: request.args[arg] for arg in ('page', 'before', 'after')
+                  if arg in request.args}
         data = {
             'items': [item.to_dict() for item in resources.items],
             '_meta': {
-                'page': page,
-                'per_page': per_page,
-                'total_pages': resources.pages,
-                'total_items': resources.total
+                'per_page': per_page
             },
             '_links': {
-                'self': url_for(endpoint, page=page, per_page=per_page,
+                'self': url_for(endpoint, per_page=per_page, **cursor,
                                 **kwargs),
-                'next': url_for(endpoint, page=page + 1, per_page=per_page,
-                                **kwargs) if resources.has_next else None,
-                'prev': url_for(endpoint, page=page - 1, per_page=per_page,
-                                **kwargs) if resources.has_prev else None
+                'next': url_for(endpoint, per_page=per_page,
+                                **resources.next_args, **kwargs)
+                if resources.has_next else None,
+                'prev': url_for(endpoint, per_page=per_page,
+                                **resources.prev_args, **kwargs)
+                if resources.has_prev else None
             }
         }
+        if resources.page is not None:
+            data['_meta'].update({
+                'page': resources.page,
+                'total_pages': resources.pages,
+                'total_items': resources.total
+            })
+        elif not cursor:
+            total = db.session.scalar(sa.select(sa.func.count()).select_from(
+                query.order_by(None).subquery()))
+            data['_meta'].update({
+                'page': 1,
+                'total_pages': (total + per_page - 1) // per_page,
+                'total_items': total
+            })
         return data
 
 
@@ -95,7 +182,25 @@ followers = sa.Table(
 )
 
 
-class User(PaginatedAPIMixin, UserMixin, db.Model):
+timeline = sa.Table(
+    'timeline',
+    db.metadata,
+    sa.Column('user_id', sa.Integer, sa.ForeignKey('user.id'),
+              primary_key=True),
+    sa.Column('post_id', sa.Integer, sa.ForeignKey('post.id'),
+              primary_key=True, index=True),
+    sa.Column('author_id', sa.Integer, sa.ForeignKey('user.id'),
+              nullable=False),
+    sa.Column('timestamp', sa.DateTime, nullable=False),
+    sa.Index('ix_timeline_user_id_timestamp', 'user_id', 'timestamp')
+)
+
+
+def avatar_url(digest, size):
+    return f'https://www.gravatar.com/avatar/{digest}?d=identicon&s={size}'
+
+
+class User(CacheableMixin, PaginatedAPIMixin, UserMixin, db.Model):
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
     username: so.Mapped[str] = so.mapped_column(sa.String(64), index=True,
                                                 unique=True)
@@ -109,6 +214,14 @@ class User(PaginatedAPIMixin, UserMixin, db.Model):
     token: so.Mapped[Optional[str]] = so.mapped_column(
         sa.String(32), index=True, unique=True)
     token_expiration: so.Mapped[Optional[datetime]]
+    followers_total: so.Mapped[int] = so.mapped_column(default=0,
+                                                       server_default='0')
+    following_total: so.Mapped[int] = so.mapped_column(default=0,
+                                                       server_default='0')
+    posts_total: so.Mapped[int] = so.mapped_column(default=0,
+                                                   server_default='0')
+    unread_messages: so.Mapped[int] = so.mapped_column(default=0,
+                                                       server_default='0')
 
     posts: so.WriteOnlyMapped['Post'] = so.relationship(
         back_populates='author')
@@ -128,6 +241,8 @@ class User(PaginatedAPIMixin, UserMixin, db.Model):
         back_populates='user')
     tasks: so.WriteOnlyMapped['Task'] = so.relationship(back_populates='user')
 
+    _snapshot_exclude = ('password_hash', 'token', 'token_expiration')
+
     def __repr__(self):
         return '<User {}>'.format(self.username)
 
@@ -137,47 +252,97 @@ class User(PaginatedAPIMixin, UserMixin, db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+    def avatar_hash(self):
+        return md5(self.email.lower().encode('utf-8')).hexdigest()
+
     def avatar(self, size):
-        digest = md5(self.email.lower().encode('utf-8')).hexdigest()
-        return f'https://www.gravatar.com/avatar/{digest}?d=identicon&s={size}'
+        return avatar_url(self.avatar_hash(), size)
+
+    def search_dependents(self):
+        # posts store the username and avatar of their author in the index
+        if not current_app.config['SEARCH_STORE_DOCUMENTS']:
+            return []
+        state = sa.inspect(self)
+        if not (state.attrs.username.history.has_changes() or
+                state.attrs.email.history.has_changes()):
+            return []
+        return db.session.scalars(self.posts.select()).all()
 
     def follow(self, user):
         if not self.is_following(user):
             self.following.add(user)
+            self._update_follow_counters(user, 1)
+            db.session.execute(timeline.insert().from_select(
+                ['user_id', 'post_id', 'author_id', 'timestamp'],
+                sa.select(sa.literal(self.id), Post.id, Post.user_id,
+                          Post.timestamp)
+                .where(Post.user_id == user.id)
+                .where(~sa.exists().where(timeline.c.user_id == self.id,
+                                          timeline.c.post_id == Post.id))))
 
     def unfollow(self, user):
         if self.is_following(user):
             self.following.remove(user)
+            self._update_follow_counters(user, -1)
+            db.session.execute(timeline.delete().where(
+                timeline.c.user_id == self.id,
+                timeline.c.author_id == user.id))
 
     def is_following(self, user):
         query = self.following.select().where(User.id == user.id)
         return db.session.scalar(query) is not None
 
+    def _update_follow_counters(self, user, delta):
+        db.session.execute(sa.update(User).where(User.id == self.id).values(
+            following_total=User.following_total + delta))
+        db.session.execute(sa.update(User).where(User.id == user.id).values(
+            followers_total=User.followers_total + delta))
+        self.invalidate_on_commit(db.session, *self.cache_tags(),
+                                  *user.cache_tags())
+
     def followers_count(self):
-        query = sa.select(sa.func.count()).select_from(
-            self.followers.select().subquery())
-        return db.session.scalar(query)
+        return self.followers_total or 0
 
     def following_count(self):
-        query = sa.select(sa.func.count()).select_from(
-            self.following.select().subquery())
-        return db.session.scalar(query)
+        return self.following_total or 0
+
+    @staticmethod
+    def reconcile_counters():
+        db.session.execute(sa.update(User).values(
+            followers_total=sa.select(sa.func.count()).where(
+                followers.c.followed_id == User.id).scalar_subquery(),
+            following_total=sa.select(sa.func.count()).where(
+                followers.c.follower_id == User.id).scalar_subquery(),
+            posts_total=sa.select(sa.func.count()).where(
+                Post.user_id == User.id).scalar_subquery(),
+            unread_messages=sa.select(sa.func.count()).where(
+                Message.recipient_id == User.id,
+                Message.timestamp > sa.func.coalesce(
+                    User.last_message_read_time, datetime(1900, 1, 1))
+            ).scalar_subquery()),
+            execution_options={'synchronize_session': 'fetch'})
 
     def following_posts(self):
-        Author = so.aliased(User)
-        Follower = so.aliased(User)
         return (
             sa.select(Post)
-            .join(Post.author.of_type(Author))
-            .join(Author.followers.of_type(Follower), isouter=True)
-            .where(sa.or_(
-                Follower.id == self.id,
-                Author.id == self.id,
-            ))
-            .group_by(Post)
-            .order_by(Post.timestamp.desc())
+            .join(timeline, timeline.c.post_id == Post.id)
+            .where(timeline.c.user_id == self.id)
+            .order_by(timeline.c.timestamp.desc())
         )
 
+    @staticmethod
+    def rebuild_timelines():
+        columns = ['user_id', 'post_id', 'author_id', 'timestamp']
+        db.session.execute(timeline.delete())
+        db.session.execute(timeline.insert().from_select(
+            columns, sa.select(Post.user_id, Post.id, Post.user_id,
+                               Post.timestamp)))
+        db.session.execute(timeline.insert().from_select(
+            columns, sa.select(followers.c.follower_id, Post.id, Post.user_id,
+                               Post.timestamp)
+            .join(followers, followers.c.followed_id == Post.user_id)
+            .where(followers.c.follower_id != Post.user_id)))
+
     def get_reset_password_token(self, expires_in=600):
         return jwt.encode(
             {'reset_password': self.id, 'exp': time() + expires_in},
@@ -193,18 +358,20 @@ class User(PaginatedAPIMixin, UserMixin, db.Model):
         return db.session.get(User, id)
 
     def unread_message_count(self):
-        last_read_time = self.last_message_read_time or datetime(1900, 1, 1)
-        query = sa.select(Message).where(Message.recipient == self,
-                                         Message.timestamp > last_read_time)
-        return db.session.scalar(sa.select(sa.func.count()).select_from(
-            query.subquery()))
+        return self.unread_messages or 0
+
+    def mark_messages_read(self):
+        self.last_message_read_time = datetime.now(timezone.utc)
+        self.unread_messages = 0
+        # the loaded value can come from a cached snapshot that is behind
+        # the database, so the counter is always written
+        so.attributes.flag_modified(self, 'unread_messages')
 
     def add_notification(self, name, data):
-        db.session.execute(self.notifications.delete().where(
-            Notification.name == name))
-        n = Notification(name=name, payload_json=json.dumps(data), user=self)
-        db.session.add(n)
-        return n
+        notification = {'name': name, 'data': data, 'timestamp': time()}
+        db.session.info.setdefault('notifications', []).append(
+            (self.id, notification))
+        return current_app.notification_store.add(self, notification)
 
     def launch_task(self, name, description, *args, **kwargs):
         rq_job = current_app.task_queue.enqueue(f'app.tasks.{name}', self.id,
@@ -224,9 +391,7 @@ class User(PaginatedAPIMixin, UserMixin, db.Model):
         return db.session.scalar(query)
 
     def posts_count(self):
-        query = sa.select(sa.func.count()).select_from(
-            self.posts.select().subquery())
-        return db.session.scalar(query)
+        return self.posts_total or 0
 
     def to_dict(self, include_email=False):
         data = {
@@ -257,6 +422,11 @@ class User(PaginatedAPIMixin, UserMixin, db.Model):
             self.set_password(data['password'])
 
     def get_token(self, expires_in=3600):
+        if current_app.config['API_TOKEN_TYPE'] == 'signed':
+            return jwt.encode(
+                {'api_token': self.id, 'jti': secrets.token_hex(8),
+                 'exp': time() + expires_in},
+                current_app.config['SECRET_KEY'], algorithm='HS256')
         now = datetime.now(timezone.utc)
         if self.token and self.token_expiration.replace(
                 tzinfo=timezone.utc) > now + timedelta(seconds=60):
@@ -266,26 +436,88 @@ class User(PaginatedAPIMixin, UserMixin, db.Model):
         db.session.add(self)
         return self.token
 
-    def revoke_token(self):
+    def revoke_token(self, token=None):
+        payload = User._decode_signed_token(token) if token else None
+        if payload is not None:
+            current_app.token_denylist.add(payload['jti'], payload['exp'])
+            return
         self.token_expiration = datetime.now(timezone.utc) - timedelta(
             seconds=1)
 
+    @staticmethod
+    def _decode_signed_token(token):
+        # opaque tokens are hexadecimal, so they never contain a dot
+        if '.' not in token:
+            return None
+        try:
+            payload = jwt.decode(token, current_app.config['SECRET_KEY'],
+                                 algorithms=['HS256'],
+                                 options={'require': ['exp', 'jti']})
+        except jwt.InvalidTokenError:
+            return None
+        if 'api_token' not in payload:
+            return None
+        return payload
+
     @staticmethod
     def check_token(token):
+        if '.' in token:
+            payload = User._decode_signed_token(token)
+            if payload is None or \
+                    payload['jti'] in current_app.token_denylist:
+                return None
+            return User.load(payload['api_token'])
         user = db.session.scalar(sa.select(User).where(User.token == token))
         if user is None or user.token_expiration.replace(
                 tzinfo=timezone.utc) < datetime.now(timezone.utc):
             return None
         return user
 
+    def identity_snapshot(self):
+        return {column.key: getattr(self, column.key)
+                for column in User.__table__.columns
+                if column.key not in User._snapshot_exclude}
+
+    @staticmethod
+    def load(id):
+        # requests that can change the user load it from the database, so
+        # that their writes are not based on a stale snapshot
+        if request.method not in ('GET', 'HEAD'):
+            return db.session.get(User, id)
+        return User.get_cached(id)
+
+    @staticmethod
+    def get_cached(id):
+        user = db.session.identity_map.get(so.util.identity_key(User, id))
+        if user is not None:
+            return user
+        key = f'user-identity:{id}'
+        snapshot = current_app.cache.get(key)
+        if snapshot is None:
+            user = db.session.get(User, id)
+            if user is not None:
+                current_app.cache.set(
+                    key, user.identity_snapshot(), tags=user.cache_tags(),
+                    timeout=current_app.config['USER_CACHE_TIMEOUT'])
+            return user
+        # attach the snapshot to the session as if it was loaded from the
+        # database, the excluded columns are loaded if they are accessed
+        user = so.class_mapper(User).class_manager.new_instance()
+        for key, value in snapshot.items():
+            so.attributes.set_committed_value(user, key, value)
+        so.make_transient_to_detached(user)
+        db.session.add(user)
+        return user
+
 
 @login.user_loader
 def load_user(id):
-    return db.session.get(User, int(id))
+    return User.load(int(id))
 
 
-class Post(SearchableMixin, db.Model):
+class Post(CacheableMixin, SearchableMixin, db.Model):
     __searchable__ = ['body']
+    __search_related__ = ['author']
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
     body: so.Mapped[str] = so.mapped_column(sa.String(140))
     timestamp: so.Mapped[datetime] = so.mapped_column(
@@ -299,6 +531,104 @@ class Post(SearchableMixin, db.Model):
     def __repr__(self):
         return '<Post {}>'.format(self.body)
 
+    def cache_tags(self):
+        return super().cache_tags() + ['post:feed']
+
+    def search_document(self):
+        return {'id': self.id, 'timestamp': self.timestamp.isoformat(),
+                'language': self.language, 'username': self.author.username,
+                'avatar_hash': self.author.avatar_hash()}
+
+    @staticmethod
+    def from_search_document(document):
+        return SearchPost(document)
+
+    @staticmethod
+    def before_flush(session, flush_context, instances):
+        counts = {}
+        for post in session.new:
+            if isinstance(post, Post):
+                author = post.author or session.get(User, post.user_id)
+                counts[author] = counts.get(author, 0) + 1
+                if post.language is None and \
+                        current_app.config['LANGUAGE_DETECTION_SYNC']:
+                    from app.languages import detect_language
+                    post.language = detect_language(post.body)
+        ids = []
+        for post in session.deleted:
+            if isinstance(post, Post):
+                counts[post.author] = counts.get(post.author, 0) - 1
+                ids.append(post.id)
+        for author, delta in counts.items():
+            if author in session.new:
+                author.posts_total = (author.posts_total or 0) + delta
+            elif delta:
+                author.posts_total = User.posts_total + delta
+        if ids:
+            session.connection().execute(timeline.delete().where(
+                timeline.c.post_id.in_(ids)))
+
+    @staticmethod
+    def after_flush(session, flush_context):
+        for post in session.new:
+            if not isinstance(post, Post):
+                continue
+            if post.language is None:
+                session.info.setdefault('detect_languages', []).append(
+                    post.id)
+            connection = session.connection()
+            connection.execute(timeline.insert().values(
+                user_id=post.user_id, post_id=post.id,
+                author_id=post.user_id, timestamp=post.timestamp))
+            connection.execute(timeline.insert().from_select(
+                ['user_id', 'post_id', 'author_id', 'timestamp'],
+                sa.select(followers.c.follower_id, sa.literal(post.id),
+                          sa.literal(post.user_id),
+                          sa.literal(post.timestamp, sa.DateTime))
+                .where(followers.c.followed_id == post.user_id,
+                       followers.c.follower_id != post.user_id)))
+
+    @staticmethod
+    def after_commit(session):
+        # the language of new posts is detected by a worker once they are
+        # committed, as langdetect is too slow to run in the request
+        ids = session.info.pop('detect_languages', None)
+        if ids:
+            from app.languages import queue_detection
+            queue_detection(ids)
+
+    @staticmethod
+    def after_rollback(session):
+        session.info.pop('detect_languages', None)
+
+
+db.event.listen(db.session, 'before_flush', Post.before_flush)
+db.event.listen(db.session, 'after_flush', Post.after_flush)
+db.event.listen(db.session, 'after_commit', Post.after_commit)
+db.event.listen(db.session, 'after_rollback', Post.after_rollback)
+register_fulltext(Post)
+
+
+class SearchAuthor:
+    def __init__(self, username, avatar_hash):
+        self.username = username
+        self.avatar_hash = avatar_hash
+
+    def avatar(self, size):
+        return avatar_url(self.avatar_hash, size)
+
+
+class SearchPost:
+    # a post built from the fields stored in the search index, with the
+    # attributes that the post templates use
+    def __init__(self, document):
+        self.id = document['id']
+        self.body = document['body']
+        self.timestamp = datetime.fromisoformat(document['timestamp'])
+        self.language = document['language']
+        self.author = SearchAuthor(document['username'],
+                                   document['avatar_hash'])
+
 
 class Message(db.Model):
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
@@ -320,6 +650,24 @@ class Message(db.Model):
     def __repr__(self):
         return '<Message {}>'.format(self.body)
 
+    @staticmethod
+    def before_flush(session, flush_context, instances):
+        counts = {}
+        for message in session.new:
+            if isinstance(message, Message):
+                recipient = message.recipient or session.get(
+                    User, message.recipient_id)
+                counts[recipient] = counts.get(recipient, 0) + 1
+        for recipient, delta in counts.items():
+            if recipient in session.new:
+                recipient.unread_messages = \
+                    (recipient.unread_messages or 0) + delta
+            else:
+                recipient.unread_messages = User.unread_messages + delta
+
+
+db.event.listen(db.session, 'before_flush', Message.before_flush)
+
 
 class Notification(db.Model):
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
@@ -334,13 +682,31 @@ class Notification(db.Model):
     def get_data(self):
         return json.loads(str(self.payload_json))
 
+    @staticmethod
+    def after_commit(session):
+        notifications = session.info.pop('notifications', None)
+        if notifications:
+            from app.notifications import after_commit
+            after_commit(notifications)
+
+    @staticmethod
+    def after_rollback(session):
+        session.info.pop('notifications', None)
+
+
+db.event.listen(db.session, 'after_commit', Notification.after_commit)
+db.event.listen(db.session, 'after_rollback', Notification.after_rollback)
+
 
 class Task(db.Model):
     id: so.Mapped[str] = so.mapped_column(sa.String(36), primary_key=True)
     name: so.Mapped[str] = so.mapped_column(sa.String(128), index=True)
     description: so.Mapped[Optional[str]] = so.mapped_column(sa.String(128))
-    user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(User.id))
+    user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(User.id),
+                                               index=True)
     complete: so.Mapped[bool] = so.mapped_column(default=False)
+    completed_at: so.Mapped[Optional[datetime]] = so.mapped_column(
+        index=True)
 
     user: so.Mapped[User] = so.relationship(back_populates='tasks')
 
@@ -354,3 +720,12 @@ class Task(db.Model):
     def get_progress(self):
         job = self.get_rq_job()
         return job.meta.get('progress', 0) if job is not None else 100
+
+
+class Translation(db.Model):
+    key: so.Mapped[str] = so.mapped_column(sa.String(64), primary_key=True)
+    source_language: so.Mapped[str] = so.mapped_column(sa.String(16))
+    dest_language: so.Mapped[str] = so.mapped_column(sa.String(16))
+    text: so.Mapped[str] = so.mapped_column(sa.Text)
+    last_used: so.Mapped[datetime] = so.mapped_column(
+        index=True, default=lambda: datetime.now(timezone.utc))
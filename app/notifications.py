@@ -0,0 +1,135 @@
+import json
+from time import time
+import sqlalchemy as sa
+from flask import current_app
+import redis
+from app import db
+from app.models import Notification
+
+
+class SQLNotificationStore:
+    # the notification table keeps the latest notification of each name
+    # and is written in the same transaction as the changes it reports
+
+    def add(self, user, notification):
+        db.session.execute(user.notifications.delete().where(
+            Notification.name == notification['name']))
+        n = Notification(name=notification['name'],
+                         payload_json=json.dumps(notification['data']),
+                         user=user, timestamp=notification['timestamp'])
+        db.session.add(n)
+        return n
+
+    def commit(self, notifications):
+        pass
+
+    def since(self, user_id, since):
+        query = sa.select(Notification).where(
+            Notification.user_id == user_id, Notification.timestamp > since) \
+            .order_by(Notification.timestamp.asc())
+        return [{
+            'name': n.name,
+            'data': n.get_data(),
+            'timestamp': n.timestamp
+        } for n in db.session.scalars(query)]
+
+
+class RedisNotificationStore:
+    # each user has a hash with the latest notification of each name, which
+    # is written once the transaction that produced it is committed
+    prefix = 'notification-store:'
+
+    def __init__(self, connection, timeout):
+        self.redis = connection
+        self.timeout = timeout
+
+    def add(self, user, notification):
+        return None
+
+    def commit(self, notifications):
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for user_id, notification in notifications:
+                key = self.prefix + str(user_id)
+                pipe.hset(key, notification['name'], json.dumps(notification))
+                pipe.expire(key, self.timeout)
+            pipe.execute()
+        except redis.exceptions.RedisError:
+            current_app.logger.exception('Could not store notifications')
+
+    def since(self, user_id, since):
+        try:
+            values = self.redis.hvals(self.prefix + str(user_id))
+        except redis.exceptions.RedisError:
+            current_app.logger.exception('Could not read notifications')
+            return []
+        notifications = [json.loads(value) for value in values]
+        return sorted((n for n in notifications if n['timestamp'] > since),
+                      key=lambda n: n['timestamp'])
+
+
+def create_notification_store(app):
+    if app.config['NOTIFICATION_BACKEND'] == 'redis':
+        return RedisNotificationStore(app.redis,
+                                      app.config['NOTIFICATION_TIMEOUT'])
+    return SQLNotificationStore()
+
+
+def channel(user_id):
+    return f'notifications:{user_id}'
+
+
+def publish(notifications):
+    # notifications is a list of (user_id, notification) pairs, sent after
+    # the commit that stored them
+    try:
+        pipe = current_app.redis.pipeline(transaction=False)
+        for user_id, notification in notifications:
+            pipe.publish(channel(user_id), json.dumps(notification))
+        pipe.execute()
+    except redis.exceptions.RedisError:
+        # clients that miss the event get it when they reconnect or poll
+        current_app.logger.exception('Could not publish notifications')
+
+
+def after_commit(notifications):
+    current_app.notification_store.commit(notifications)
+    publish(notifications)
+
+
+def notifications_since(user, since):
+    return current_app.notification_store.since(user.id, since)
+
+
+def subscribe(user_id):
+    pubsub = current_app.redis.pubsub(ignore_subscribe_messages=True)
+    try:
+        pubsub.subscribe(channel(user_id))
+    except redis.exceptions.RedisError:
+        pubsub.close()
+        raise
+    return pubsub
+
+
+def _event(notification):
+    return 'id: {}\ndata: {}\n\n'.format(notification['timestamp'],
+                                         json.dumps(notification))
+
+
+def event_stream(pubsub, backlog, timeout, keepalive):
+    # this runs after the request has returned, so it does not use the
+    # application context or the database
+    try:
+        for notification in backlog:
+            yield _event(notification)
+        deadline = time() + timeout
+        while time() < deadline:
+            message = pubsub.get_message(timeout=keepalive)
+            if message is None:
+                yield ': keepalive\n\n'
+            elif message['type'] == 'message':
+                yield _event(json.loads(message['data']))
+    except redis.exceptions.RedisError:
+        pass
+    finally:
+        pubsub.close()
@@ -0,0 +1,151 @@
+import base64
+import binascii
+from datetime import datetime
+import json
+import operator
+import sqlalchemy as sa
+from flask import request, abort
+from app import db
+
+
+def encode_cursor(values):
+    data = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(
+        data, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+
+def decode_values(cursor, length):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, binascii.Error):
+        raise ValueError('invalid cursor')
+    if not isinstance(values, list) or len(values) != length:
+        raise ValueError('invalid cursor')
+    return values
+
+
+def decode_cursor(cursor, columns):
+    values = decode_values(cursor, len(columns))
+    # the values come from the client, so they must have the type of their
+    # column before they are sent to the database
+    decoded = []
+    for column, value in zip(columns, values):
+        python_type = column.type.python_type
+        if python_type is datetime:
+            try:
+                value = datetime.fromisoformat(value)
+            except TypeError:
+                raise ValueError('invalid cursor')
+        elif not isinstance(value, python_type) or (
+                isinstance(value, bool) and python_type is not bool):
+            raise ValueError('invalid cursor')
+        decoded.append(value)
+    return decoded
+
+
+def keyset_filter(columns, values, op):
+    # lexicographic comparison of (c1, c2, ...) against (v1, v2, ...),
+    # written out so that it works on databases without row values
+    condition = op(columns[-1], values[-1])
+    for column, value in zip(reversed(columns[:-1]), reversed(values[:-1])):
+        condition = sa.or_(op(column, value),
+                           sa.and_(column == value, condition))
+    return condition
+
+
+class Page:
+    def __init__(self, items, next_args=None, prev_args=None, page=None,
+                 pages=None, total=None):
+        self.items = items
+        self.next_args = next_args
+        self.prev_args = prev_args
+        self.page = page
+        self.pages = pages
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_args is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_args is not None
+
+
+def _directions(descending):
+    # the cursor that moves to the next page is the one that points further
+    # along the order of the list
+    return ('before', 'after') if descending else ('after', 'before')
+
+
+def keyset_paginate(query, columns, per_page, before=None, after=None,
+                    key=None, descending=True):
+    if key is None:
+        def key(item):
+            return tuple(getattr(item, column.key) for column in columns)
+    forward, backward = _directions(descending)
+    cursors = {'before': before, 'after': after}
+    ahead, behind = (operator.lt, operator.gt) if descending else \
+        (operator.gt, operator.lt)
+    query = query.order_by(None).limit(per_page + 1)
+    if cursors[backward] is not None:
+        query = query.where(keyset_filter(
+            columns, decode_cursor(cursors[backward], columns), behind))
+        query = query.order_by(*[column.asc() if descending
+                                 else column.desc() for column in columns])
+    else:
+        if cursors[forward] is not None:
+            query = query.where(keyset_filter(
+                columns, decode_cursor(cursors[forward], columns), ahead))
+        query = query.order_by(*[column.desc() if descending
+                                 else column.asc() for column in columns])
+    items = db.session.scalars(query).all()
+    return cursor_page(items[:per_page], len(items) > per_page, before, after,
+                       key, descending=descending)
+
+
+def cursor_page(items, more, before, after, key, total=None,
+                descending=True):
+    # items come in the order of the query, which is reversed when paging
+    # back towards the start of the list
+    forward, backward = _directions(descending)
+    cursors = {'before': before, 'after': after}
+    if cursors[backward] is not None:
+        items.reverse()
+        has_next, has_prev = True, more
+    else:
+        has_next, has_prev = more, cursors[forward] is not None
+    if not items:
+        return Page(items, total=total)
+    return Page(
+        items,
+        next_args={forward: encode_cursor(key(items[-1]))}
+        if has_next else None,
+        prev_args={backward: encode_cursor(key(items[0]))}
+        if has_prev else None,
+        total=total)
+
+
+def paginate(query, columns, per_page, key=None, descending=True):
+    # page numbers are still accepted for compatibility with old links, but
+    # the links that are generated use cursors, which cost the same on any
+    # page and do not need to count the rows of the query
+    page = request.args.get('page', type=int)
+    if page is not None:
+        pagination = db.paginate(query, page=page, per_page=per_page,
+                                 error_out=False)
+        return Page(
+            pagination.items,
+            next_args={'page': pagination.next_num}
+            if pagination.has_next else None,
+            prev_args={'page': pagination.prev_num}
+            if pagination.has_prev else None,
+            page=pagination.page, pages=pagination.pages,
+            total=pagination.total)
+    try:
+        return keyset_paginate(query, columns, per_page,
+                               before=request.args.get('before'),
+                               after=request.args.get('after'), key=key,
+                               descending=descending)
+    except ValueError:
+        abort(400)
@@ -0,0 +1,53 @@
+import multiprocessing
+import sqlalchemy as sa
+from app import db
+
+_app = None
+
+
+def _init_worker():
+    global _app
+    from app import create_app
+    _app = create_app()
+    _app.app_context().push()
+
+
+def run_parallel(func, tasks, workers):
+    # func must be importable by the worker processes, which start with a
+    # fresh interpreter and create their own application instance
+    if workers <= 1:
+        return [func(*args) for args in tasks]
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(workers, initializer=_init_worker) as pool:
+        return pool.starmap(func, tasks)
+
+
+def _call(task):
+    func, args = task
+    return func(*args)
+
+
+def iter_parallel(func, tasks, workers):
+    # like run_parallel, but each result is yielded as soon as its task
+    # finishes, in the order in which they finish
+    if workers <= 1:
+        for args in tasks:
+            yield func(*args)
+        return
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(workers, initializer=_init_worker) as pool:
+        yield from pool.imap_unordered(_call, [(func, args) for args in tasks])
+
+
+def id_ranges(model, parts):
+    return key_ranges(model.id, parts)
+
+
+def key_ranges(column, parts):
+    low, high = db.session.execute(sa.select(
+        sa.func.min(column), sa.func.max(column))).one()
+    if low is None:
+        return []
+    step = (high - low) // parts + 1
+    return [[start, min(start + step, high + 1)]
+            for start in range(low, high + 1, step)]
@@ -0,0 +1,123 @@
+from datetime import datetime, timezone
+from threading import Lock
+from time import time
+import sqlalchemy as sa
+from flask import current_app
+import redis
+from app import db
+from app.models import User
+
+
+class MemoryPresence:
+    def __init__(self):
+        self.lock = Lock()
+        self.activity = {}
+        self.pending = {}
+        self.last_flush = time()
+
+    def record(self, user_id, timestamp):
+        with self.lock:
+            self.activity[user_id] = timestamp
+            self.pending[user_id] = timestamp
+
+    def pop_pending(self, interval):
+        with self.lock:
+            if time() - self.last_flush < interval:
+                return {}
+            pending, self.pending = self.pending, {}
+            self.last_flush = time()
+            return pending
+
+    def last_activity(self, user_id):
+        return self.activity.get(user_id)
+
+    def active_since(self, timestamp, limit):
+        with self.lock:
+            self.activity = {user_id: ts for user_id, ts
+                             in self.activity.items() if ts >= timestamp}
+            active = sorted(self.activity.items(), key=lambda item: item[1],
+                            reverse=True)
+        return [user_id for user_id, ts in active[:limit]]
+
+
+class RedisPresence:
+    activity_key = 'presence:activity'
+    pending_key = 'presence:pending'
+    lock_key = 'presence:flush-lock'
+
+    def __init__(self, connection):
+        self.redis = connection
+
+    def record(self, user_id, timestamp):
+        pipe = self.redis.pipeline()
+        pipe.zadd(self.activity_key, {user_id: timestamp})
+        pipe.zadd(self.pending_key, {user_id: timestamp})
+        pipe.execute()
+
+    def pop_pending(self, interval):
+        # only one process gets to flush the buffer in each interval
+        if not self.redis.set(self.lock_key, 1, nx=True, ex=interval):
+            return {}
+        pipe = self.redis.pipeline()
+        pipe.zrange(self.pending_key, 0, -1, withscores=True)
+        pipe.delete(self.pending_key)
+        pipe.zremrangebyscore(self.activity_key, '-inf', time() - 86400)
+        pending = pipe.execute()[0]
+        return {int(user_id): ts for user_id, ts in pending}
+
+    def last_activity(self, user_id):
+        return self.redis.zscore(self.activity_key, user_id)
+
+    def active_since(self, timestamp, limit):
+        return [int(user_id) for user_id in self.redis.zrevrangebyscore(
+            self.activity_key, '+inf', timestamp, start=0, num=limit)]
+
+
+def create_presence(app):
+    if app.config['PRESENCE_BACKEND'] == 'redis':
+        return RedisPresence(app.redis)
+    return MemoryPresence()
+
+
+def flush_last_seen(pending):
+    if not pending:
+        return
+    user_table = User.__table__
+    db.session.execute(
+        sa.update(user_table)
+        .where(user_table.c.id == sa.bindparam('user_id'))
+        .values(last_seen=sa.bindparam('seen')),
+        [{'user_id': user_id,
+          'seen': datetime.fromtimestamp(timestamp, timezone.utc)}
+         for user_id, timestamp in pending.items()])
+    db.session.commit()
+
+
+def record_activity(user):
+    try:
+        current_app.presence.record(user.id, time())
+        pending = current_app.presence.pop_pending(
+            current_app.config['PRESENCE_FLUSH_INTERVAL'])
+    except redis.exceptions.RedisError:
+        current_app.logger.exception('Could not buffer activity')
+        pending = {user.id: time()}
+    flush_last_seen(pending)
+
+
+def is_online(user):
+    try:
+        last_activity = current_app.presence.last_activity(user.id)
+    except redis.exceptions.RedisError:
+        return False
+    return last_activity is not None and last_activity >= \
+        time() - current_app.config['PRESENCE_ONLINE_WINDOW']
+
+
+def online_users(limit):
+    ids = current_app.presence.active_since(
+        time() - current_app.config['PRESENCE_ONLINE_WINDOW'], limit)
+    if not ids:
+        return []
+    users = {user.id: user for user in db.session.scalars(
+        sa.select(User).where(User.id.in_(ids)))}
+    return [users[user_id] for user_id in ids if user_id in users]
@@ -1,28 +1,565 @@
+from datetime import timedelta
+from hashlib import md5
+import json
+import re
+from time import time
+import sqlalchemy as sa
+import sqlalchemy.orm as so
 from flask import current_app
+import redis
+from app import db
+from app.pagination import cursor_page, decode_values
+from app.parallel import id_ranges, run_parallel
 
+QUEUE_KEY = 'search:queue'
+DEAD_LETTER_KEY = 'search:dead-letter'
+JOB_SCHEDULED_KEY = 'search:job-scheduled'
+CACHE_STATS_KEY = 'search:cache-stats'
 
-def add_to_index(index, model):
-    if not current_app.elasticsearch:
-        return
+
+def _document(model):
     payload = {}
     for field in model.__searchable__:
         payload[field] = getattr(model, field)
-    current_app.elasticsearch.index(index=index, id=model.id, document=payload)
+    return payload
+
+
+def _stored_document(model):
+    # the fields needed to display results can be stored in the index, so
+    # that search pages are rendered without going to the database
+    document = _document(model)
+    if current_app.config['SEARCH_STORE_DOCUMENTS']:
+        document.update(model.search_document())
+    return document
+
+
+def _load_options(model):
+    if not current_app.config['SEARCH_STORE_DOCUMENTS']:
+        return []
+    return [so.joinedload(getattr(model, name))
+            for name in getattr(model, '__search_related__', [])]
+
+
+def checkpoint_key(alias):
+    return f'search:reindex:{alias}'
+
+
+def _target_indexes(alias):
+    # while an index is being rebuilt, changes are written to both the live
+    # index and the new one, so that nothing is lost when the alias moves
+    try:
+        building = current_app.redis.hget(checkpoint_key(alias), 'index')
+    except redis.exceptions.RedisError:
+        building = None
+    return [alias] + ([building.decode()] if building else [])
+
+
+def _es_add(index, model):
+    for target in _target_indexes(index):
+        current_app.elasticsearch.index(index=target, id=model.id,
+                                        document=_stored_document(model))
+
+
+def _es_remove(index, model):
+    for target in _target_indexes(index):
+        current_app.elasticsearch.delete(index=target, id=model.id,
+                                         ignore_status=404)
+
+
+class SearchBackend:
+    # backends that store documents also implement query_documents()
+    stores_documents = False
+
+    def add(self, index, model):
+        pass
+
+    def remove(self, index, model):
+        pass
+
+    def query(self, index, query, page, per_page):
+        return [], 0
+
+    def sync(self, connection, changes):
+        # called from after_flush with the (index, model, operation) changes
+        # of the flush, operation being 'index' or 'delete'
+        pass
+
+    def commit(self, changes):
+        # called from after_commit with all the changes of the transaction
+        pass
+
+    def rebuild(self, model, **kwargs):
+        return 0
+
+
+class ElasticsearchBackend(SearchBackend):
+    def add(self, index, model):
+        _es_add(index, model)
+
+    def remove(self, index, model):
+        _es_remove(index, model)
+
+    def query(self, index, query, page, per_page):
+        search = current_app.elasticsearch.search(
+            index=index, query=self._match(index, query),
+            from_=(page - 1) * per_page, size=per_page, source=False)
+        ids = [int(hit['_id']) for hit in search['hits']['hits']]
+        return ids, search['hits']['total']['value']
+
+    @property
+    def stores_documents(self):
+        return current_app.config['SEARCH_STORE_DOCUMENTS']
+
+    @staticmethod
+    def _match(index, query):
+        # stored fields such as the author are not searched
+        return {'multi_match': {
+            'query': query, 'fields': _searchable_model(index).__searchable__}}
+
+    def query_documents(self, index, query, per_page, before=None,
+                        after=None):
+        # pages are requested with search_after cursors, which unlike
+        # from/size cost the same however deep the page is
+        order = 'asc' if after is not None else 'desc'
+        kwargs = {}
+        if after is not None or before is not None:
+            # cursors come from the client, so they are checked before they
+            # reach elasticsearch
+            values = decode_values(after or before, 2)
+            if not all(isinstance(value, (int, float)) and
+                       not isinstance(value, bool) for value in values):
+                raise ValueError('invalid cursor')
+            kwargs['search_after'] = values
+        search = current_app.elasticsearch.search(
+            index=index, query=self._match(index, query),
+            sort=[{'_score': order}, {'id': order}], size=per_page + 1,
+            **kwargs)
+        hits = search['hits']['hits']
+        page = cursor_page(hits[:per_page], len(hits) > per_page, before,
+                           after, lambda hit: hit['sort'],
+                           total=search['hits']['total']['value'])
+        page.items = [hit['_source'] for hit in page.items]
+        return page
+
+    def commit(self, changes):
+        if not changes:
+            return
+        if not current_app.config['SEARCH_INDEX_SYNC']:
+            try:
+                enqueue_changes([{'index': index, 'id': model.id, 'op': op}
+                                 for index, model, op in changes])
+                return
+            except redis.exceptions.RedisError:
+                current_app.logger.exception('Could not queue search changes')
+        for index, model, op in changes:
+            if op == 'index':
+                _es_add(index, model)
+            else:
+                _es_remove(index, model)
+
+    def rebuild(self, model, **kwargs):
+        return rebuild_index(model, **kwargs)
+
+
+def _terms(query):
+    # only word characters are kept, so that user input cannot use the query
+    # syntax of the database
+    return re.findall(r'\w+', query)
+
+
+class SQLiteBackend(SearchBackend):
+    def add(self, index, model):
+        self.sync(db.session.connection(), [(index, model, 'index')])
+
+    def remove(self, index, model):
+        self.sync(db.session.connection(), [(index, model, 'delete')])
+
+    def query(self, index, query, page, per_page):
+        terms = _terms(query)
+        if not terms:
+            return [], 0
+        match = ' OR '.join(f'"{term}"' for term in terms)
+        ids = db.session.scalars(sa.text(
+            f'SELECT rowid FROM {index}_fts WHERE {index}_fts MATCH :match '
+            'ORDER BY rank LIMIT :limit OFFSET :offset'),
+            {'match': match, 'limit': per_page,
+             'offset': (page - 1) * per_page}).all()
+        total = db.session.scalar(sa.text(
+            f'SELECT count(*) FROM {index}_fts '
+            f'WHERE {index}_fts MATCH :match'), {'match': match})
+        return ids, total
+
+    def sync(self, connection, changes):
+        for index, model, op in changes:
+            connection.execute(sa.text(f'DELETE FROM {index}_fts '
+                                       'WHERE rowid = :id'), {'id': model.id})
+            if op == 'index':
+                fields = model.__searchable__
+                connection.execute(sa.text(
+                    'INSERT INTO {}_fts (rowid, {}) VALUES (:id, {})'.format(
+                        index, ', '.join(fields),
+                        ', '.join(':' + field for field in fields))),
+                    dict(_document(model), id=model.id))
+
+    def rebuild(self, model, **kwargs):
+        index = model.__tablename__
+        fields = ', '.join(model.__searchable__)
+        db.session.execute(sa.text(f'DELETE FROM {index}_fts'))
+        result = db.session.execute(sa.text(
+            f'INSERT INTO {index}_fts (rowid, {fields}) '
+            f'SELECT id, {fields} FROM {index}'))
+        db.session.commit()
+        return result.rowcount
+
+
+def _tsvector(model):
+    # this expression has to match the one in the index exactly
+    document = " || ' ' || ".join(f"coalesce({field}, '')"
+                                  for field in model.__searchable__)
+    return f"to_tsvector('simple', {document})"
+
+
+class PostgresBackend(SearchBackend):
+    # the GIN index over the document is maintained by the database, so
+    # there is nothing to synchronize
+
+    def query(self, index, query, page, per_page):
+        terms = _terms(query)
+        if not terms:
+            return [], 0
+        model = _searchable_model(index)
+        vector = _tsvector(model)
+        params = {'query': ' | '.join(terms), 'limit': per_page,
+                  'offset': (page - 1) * per_page}
+        ids = db.session.scalars(sa.text(
+            f'SELECT id FROM "{index}" '
+            f"WHERE {vector} @@ to_tsquery('simple', :query) "
+            f"ORDER BY ts_rank({vector}, to_tsquery('simple', :query)) DESC, "
+            'id DESC LIMIT :limit OFFSET :offset'), params).all()
+        total = db.session.scalar(sa.text(
+            f'SELECT count(*) FROM "{index}" '
+            f"WHERE {vector} @@ to_tsquery('simple', :query)"), params)
+        return ids, total
+
+
+def fulltext_ddl(model):
+    index = model.__tablename__
+    return {
+        'sqlite': (
+            'CREATE VIRTUAL TABLE IF NOT EXISTS {}_fts USING fts5({})'.format(
+                index, ', '.join(model.__searchable__)),
+            f'DROP TABLE IF EXISTS {index}_fts'),
+        'postgresql': (
+            f'CREATE INDEX IF NOT EXISTS ix_{index}_fulltext ON "{index}" '
+            f'USING gin ({_tsvector(model)})',
+            f'DROP INDEX IF EXISTS ix_{index}_fulltext'),
+    }
+
+
+def register_fulltext(model):
+    for dialect, (create, drop) in fulltext_ddl(model).items():
+        sa.event.listen(model.__table__, 'after_create',
+                        sa.DDL(create).execute_if(dialect=dialect))
+        sa.event.listen(model.__table__, 'after_drop',
+                        sa.DDL(drop).execute_if(dialect=dialect))
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    # keeps the full-text tables and indexes out of alembic autogenerate
+    if reflected and compare_to is None:
+        if type_ == 'table' and '_fts' in name:
+            return False
+        if type_ == 'index' and name.endswith('_fulltext'):
+            return False
+    return True
+
+
+def create_search_backend(app):
+    if app.config['SEARCH_BACKEND'] == 'elasticsearch':
+        return ElasticsearchBackend()
+    if app.config['SEARCH_BACKEND'] == 'database':
+        with app.app_context():
+            dialect = db.engine.dialect.name
+        if dialect == 'sqlite':
+            return SQLiteBackend()
+        if dialect == 'postgresql':
+            return PostgresBackend()
+    return SearchBackend()
+
+
+def add_to_index(index, model):
+    current_app.search_backend.add(index, model)
+    bump_generation(index)
 
 
 def remove_from_index(index, model):
-    if not current_app.elasticsearch:
+    current_app.search_backend.remove(index, model)
+    bump_generation(index)
+
+
+# Results are cached with a tag for their index. Changes to the index bump
+# the version of the tag, which works as a generation counter that
+# invalidates all the cached results of the index at once.
+
+def _generation_tag(index):
+    return f'search:{index}'
+
+
+def _cache_key(index, query, page, per_page):
+    digest = md5(query.encode('utf-8')).hexdigest()
+    return f'search:{index}:{digest}:{page}:{per_page}'
+
+
+def bump_generation(*indexes):
+    current_app.cache.invalidate(*[_generation_tag(index)
+                                   for index in indexes])
+
+
+def _shared_cache():
+    # a worker can only refresh entries for the web processes, and their
+    # statistics are only worth keeping, when the cache is in redis
+    return current_app.config['CACHE_TYPE'] == 'redis'
+
+
+def _record_stat(name):
+    if not _shared_cache():
         return
-    current_app.elasticsearch.delete(index=index, id=model.id)
+    try:
+        current_app.redis.hincrby(CACHE_STATS_KEY, name, 1)
+    except redis.exceptions.RedisError:
+        pass
+
+
+def cache_stats():
+    stats = {'hits': 0, 'misses': 0, 'refreshes': 0}
+    stats.update({name.decode(): int(value) for name, value
+                  in current_app.redis.hgetall(CACHE_STATS_KEY).items()})
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+    return stats
+
+
+def refresh_query(index, query, page, per_page):
+    ids, total = current_app.search_backend.query(index, query, page,
+                                                  per_page)
+    current_app.cache.set(
+        _cache_key(index, query, page, per_page), (ids, total, time()),
+        timeout=current_app.config['SEARCH_CACHE_TIMEOUT'],
+        tags=[_generation_tag(index)])
+    return ids, total
+
+
+def _schedule_refresh(key, index, query, page, per_page):
+    # queries that are still being asked for when their entry gets old are
+    # refreshed by a worker, so that popular queries do not expire
+    try:
+        if current_app.redis.set(
+                key + ':refresh', 1, nx=True,
+                ex=current_app.config['SEARCH_CACHE_REFRESH_AFTER']):
+            current_app.task_queue.enqueue('app.tasks.refresh_search_query',
+                                           index, query, page, per_page)
+            _record_stat('refreshes')
+    except redis.exceptions.RedisError:
+        current_app.logger.exception('Could not schedule search refresh')
 
 
 def query_index(index, query, page, per_page):
-    if not current_app.elasticsearch:
-        return [], 0
-    search = current_app.elasticsearch.search(
-        index=index,
-        query={'multi_match': {'query': query, 'fields': ['*']}},
-        from_=(page - 1) * per_page,
-        size=per_page)
-    ids = [int(hit['_id']) for hit in search['hits']['hits']]
-    return ids, search['hits']['total']['value']
+    if not current_app.config['SEARCH_CACHE_TIMEOUT']:
+        return current_app.search_backend.query(index, query, page,
+                                                per_page)
+    key = _cache_key(index, query, page, per_page)
+    entry = current_app.cache.get(key)
+    if entry is None:
+        _record_stat('misses')
+        return refresh_query(index, query, page, per_page)
+    _record_stat('hits')
+    ids, total, stored_at = entry
+    if time() - stored_at > current_app.config['SEARCH_CACHE_REFRESH_AFTER']:
+        if not _shared_cache():
+            return refresh_query(index, query, page, per_page)
+        _schedule_refresh(key, index, query, page, per_page)
+    return ids, total
+
+
+def enqueue_changes(entries):
+    current_app.redis.rpush(QUEUE_KEY, *[json.dumps(e) for e in entries])
+    # a single job drains the queue, so a new one is only needed when
+    # there is none waiting to run
+    if current_app.redis.set(JOB_SCHEDULED_KEY, 1, nx=True, ex=300):
+        current_app.task_queue.enqueue('app.tasks.process_search_queue')
+
+
+def coalesce_changes(entries):
+    # only the last operation on each document matters
+    changes = {}
+    for entry in entries:
+        key = (entry['index'], entry['id'])
+        attempts = max(entry.get('attempts', 0),
+                       changes.get(key, {}).get('attempts', 0))
+        changes[key] = dict(entry, attempts=attempts)
+    return list(changes.values())
+
+
+def _searchable_model(index):
+    for mapper in db.Model.registry.mappers:
+        if getattr(mapper.class_, '__tablename__', None) == index:
+            return mapper.class_
+
+
+def _bulk_actions(entries):
+    ids = {}
+    for entry in entries:
+        if entry['op'] == 'index':
+            ids.setdefault(entry['index'], set()).add(entry['id'])
+    documents = {}
+    for index, index_ids in ids.items():
+        model = _searchable_model(index)
+        for obj in db.session.scalars(sa.select(model).where(
+                model.id.in_(index_ids)).options(*_load_options(model))):
+            documents[(index, obj.id)] = _stored_document(obj)
+    targets = {index: _target_indexes(index)
+               for index in {entry['index'] for entry in entries}}
+    actions = []
+    for entry in entries:
+        document = documents.get((entry['index'], entry['id']))
+        for target in targets[entry['index']]:
+            # rows deleted after they were queued are removed as well
+            op = 'index' if entry['op'] == 'index' and document is not None \
+                else 'delete'
+            actions.append((entry, {op: {'_index': target,
+                                         '_id': entry['id']}}, document))
+    return actions
+
+
+def _operations(actions):
+    operations = []
+    for entry, action, document in actions:
+        operations.append(action)
+        if 'index' in action:
+            operations.append(document)
+    return operations
+
+
+def bulk_operations(entries):
+    return _operations(_bulk_actions(entries))
+
+
+def _pop_batch(size):
+    pipe = current_app.redis.pipeline()
+    pipe.lrange(QUEUE_KEY, 0, size - 1)
+    pipe.ltrim(QUEUE_KEY, size, -1)
+    return [json.loads(entry) for entry in pipe.execute()[0]]
+
+
+def _send_bulk(entries):
+    actions = _bulk_actions(entries)
+    try:
+        response = current_app.elasticsearch.bulk(
+            operations=_operations(actions))
+    except Exception as exc:
+        return [(entry, str(exc)) for entry in entries]
+    if not response['errors']:
+        return []
+    failed = {}
+    for (entry, action, document), item in zip(actions, response['items']):
+        op, result = next(iter(item.items()))
+        if result.get('error') and not (
+                op == 'delete' and result.get('status') == 404):
+            failed[id(entry)] = (entry, json.dumps(result['error']))
+    return list(failed.values())
+
+
+def process_queue():
+    current_app.redis.delete(JOB_SCHEDULED_KEY)
+    size = current_app.config['SEARCH_INDEX_BATCH_SIZE']
+    retries = []
+    while True:
+        entries = coalesce_changes(_pop_batch(size))
+        if not entries:
+            break
+        failed = _send_bulk(entries)
+        bump_generation(*{entry['index'] for entry in entries})
+        for entry, error in failed:
+            entry['attempts'] += 1
+            if entry['attempts'] >= \
+                    current_app.config['SEARCH_INDEX_MAX_ATTEMPTS']:
+                current_app.redis.rpush(DEAD_LETTER_KEY, json.dumps(
+                    dict(entry, error=error)))
+            else:
+                retries.append(entry)
+        db.session.rollback()
+    if retries:
+        current_app.redis.rpush(QUEUE_KEY, *[json.dumps(e) for e in retries])
+        current_app.task_queue.enqueue_in(
+            timedelta(seconds=current_app.config['SEARCH_INDEX_RETRY_DELAY']),
+            'app.tasks.process_search_queue')
+    return len(retries)
+
+
+def reindex_range(alias, index, start, end, batch_size):
+    model = _searchable_model(alias)
+    key = checkpoint_key(alias)
+    field = f'{start}-{end}'
+    last_id = current_app.redis.hget(key, field)
+    if last_id is not None:
+        start = int(last_id) + 1
+    query = sa.select(model).where(model.id >= start, model.id < end) \
+        .options(*_load_options(model)).order_by(model.id) \
+        .execution_options(yield_per=batch_size)
+    count = 0
+    for batch in db.session.scalars(query).partitions():
+        operations = []
+        for obj in batch:
+            operations.extend([{'index': {'_index': index, '_id': obj.id}},
+                               _stored_document(obj)])
+        response = current_app.elasticsearch.bulk(operations=operations)
+        if response['errors']:
+            raise RuntimeError(f'Bulk indexing into {index} failed')
+        current_app.redis.hset(key, field, batch[-1].id)
+        count += len(batch)
+    db.session.rollback()
+    return count
+
+
+def swap_alias(alias, index):
+    es = current_app.elasticsearch
+    old_indexes = []
+    actions = []
+    if es.indices.exists_alias(name=alias):
+        old_indexes = [name for name in es.indices.get_alias(name=alias)
+                       if name != index]
+        actions.extend([{'remove': {'index': name, 'alias': alias}}
+                        for name in old_indexes])
+    elif es.indices.exists(index=alias):
+        # a concrete index created before aliases were used is replaced
+        # in the same atomic operation
+        actions.append({'remove_index': {'index': alias}})
+    actions.append({'add': {'index': index, 'alias': alias}})
+    es.indices.update_aliases(actions=actions)
+    for name in old_indexes:
+        es.indices.delete(index=name)
+
+
+def rebuild_index(model, workers=1, batch_size=1000, resume=False):
+    alias = model.__tablename__
+    key = checkpoint_key(alias)
+    checkpoint = current_app.redis.hgetall(key)
+    if resume and checkpoint:
+        index = checkpoint[b'index'].decode()
+        ranges = json.loads(checkpoint[b'ranges'])
+    else:
+        if checkpoint:
+            current_app.elasticsearch.indices.delete(
+                index=checkpoint[b'index'].decode(), ignore_unavailable=True)
+            current_app.redis.delete(key)
+        index = f'{alias}-{int(time() * 1000)}'
+        current_app.elasticsearch.indices.create(index=index)
+        ranges = id_ranges(model, workers)
+        current_app.redis.hset(key, mapping={'index': index,
+                                             'ranges': json.dumps(ranges)})
+    counts = run_parallel(
+        reindex_range, [(alias, index, start, end, batch_size)
+                        for start, end in ranges], workers)
+    swap_alias(alias, index)
+    current_app.redis.delete(key)
+    return sum(counts)
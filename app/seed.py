@@ -0,0 +1,144 @@
+from datetime import timedelta
+from itertools import accumulate, islice
+import random
+import sqlalchemy as sa
+from werkzeug.security import generate_password_hash
+from app import db
+from app.models import User, Post, Message, followers
+
+WORDS = '''
+    the a of and to in is it that was for on are with as his they be at one
+    have this from or had by word but what some we can out other were all
+    there when up use your how said an each she which do their time if will
+    way about many then them write would like so these her long make thing see
+    him two has look more day could go come did number sound no most people
+    my over know water than call first who may down side been now find any new
+    work part take get place made live where after back little only round man
+    year came show every good me give our under name very through just form
+    sentence great think say help low line differ turn cause much mean before
+    move right boy old too same tell does set three want air well also play
+    small end put home read hand port large spell add even land here must big
+    high such follow act why ask men change went light kind off need house
+    picture try us again animal point mother world near build self earth
+'''.split()
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _bulk_insert(table, rows, batch_size):
+    # executemany is sent as multi-row INSERT statements by sqlalchemy, and
+    # unlike insert().values() the statement is compiled only once
+    count = 0
+    for batch in _batched(rows, batch_size):
+        db.session.execute(table.insert(), batch)
+        count += len(batch)
+    return count
+
+
+def _text(rng, low, high):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(low, high)))[:140]
+
+
+def _timestamps(rng, count, start, end):
+    # a poisson process, so that the rows come in time order with realistic
+    # gaps between them and can be generated without sorting
+    step = (end - start).total_seconds() / max(count, 1)
+    t = 0.0
+    for _ in range(count):
+        t += rng.expovariate(1 / step)
+        yield min(start + timedelta(seconds=t), end)
+
+
+def _popularity(rng, ids, alpha):
+    # cumulative weights of a power law over the users in a random order,
+    # so that the popular users are spread over the id range
+    ranked = list(ids)
+    rng.shuffle(ranked)
+    return ranked, list(accumulate(1 / rank ** alpha
+                                   for rank in range(1, len(ranked) + 1)))
+
+
+def _reset_sequence(table):
+    # the user ids are given explicitly, so the postgres sequence has to be
+    # moved past them
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(sa.text(
+            f"SELECT setval(pg_get_serial_sequence('\"{table.name}\"', 'id'), "
+            f'(SELECT max(id) FROM "{table.name}"))'))
+
+
+def _users(rng, ids, password_hash, start, end, prefix):
+    window = (end - start).total_seconds()
+    for id in ids:
+        yield {'id': id, 'username': f'{prefix}{id}',
+               'email': f'{prefix}{id}@example.com',
+               'password_hash': password_hash, 'about_me': _text(rng, 3, 15),
+               'last_seen': start + timedelta(seconds=rng.uniform(0, window))}
+
+
+def _follows(rng, ids, ranked, weights, average):
+    for id in ids:
+        count = min(rng.randint(0, 2 * average), len(ids) - 1)
+        targets = set()
+        while len(targets) < count:
+            targets.update(target for target in rng.choices(
+                ranked, cum_weights=weights, k=count - len(targets))
+                if target != id)
+        for target in sorted(targets):
+            yield {'follower_id': id, 'followed_id': target}
+
+
+def _posts(rng, count, ranked, weights, start, end):
+    for timestamp in _timestamps(rng, count, start, end):
+        yield {'body': _text(rng, 3, 25), 'timestamp': timestamp,
+               'user_id': rng.choices(ranked, cum_weights=weights)[0],
+               'language': 'en'}
+
+
+def _messages(rng, count, ids, ranked, weights, start, end):
+    for timestamp in _timestamps(rng, count, start, end):
+        sender = rng.choice(ids)
+        recipient = sender
+        while recipient == sender:
+            recipient = rng.choices(ranked, cum_weights=weights)[0]
+        yield {'sender_id': sender, 'recipient_id': recipient,
+               'body': _text(rng, 3, 25), 'timestamp': timestamp}
+
+
+def seed_data(users, posts, messages, follows, alpha, start, end, seed=0,
+              batch_size=1000, password='password', prefix='user'):
+    # rows are written with multi-row inserts that bypass the session
+    # events, so timelines, counters and the search index are rebuilt by
+    # the caller afterwards
+    rng = random.Random(seed)
+    first_id = (db.session.scalar(sa.select(sa.func.max(User.id))) or 0) + 1
+    ids = list(range(first_id, first_id + users))
+    if len(ids) < 2:
+        raise ValueError('at least two users are needed')
+    # followers and posting activity follow independent power laws, so that
+    # the most followed users are not also the most prolific authors
+    ranked, weights = _popularity(rng, ids, alpha)
+    authors, activity = _popularity(rng, ids, alpha)
+    counts = {}
+    counts['users'] = _bulk_insert(User.__table__, _users(
+        rng, ids, generate_password_hash(password), start, end, prefix),
+        batch_size)
+    _reset_sequence(User.__table__)
+    db.session.commit()
+    counts['follows'] = _bulk_insert(
+        followers, _follows(rng, ids, ranked, weights, follows), batch_size)
+    db.session.commit()
+    counts['posts'] = _bulk_insert(
+        Post.__table__, _posts(rng, posts, authors, activity, start, end),
+        batch_size)
+    db.session.commit()
+    counts['messages'] = _bulk_insert(
+        Message.__table__,
+        _messages(rng, messages, ids, ranked, weights, start, end),
+        batch_size)
+    db.session.commit()
+    return counts
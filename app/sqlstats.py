@@ -0,0 +1,109 @@
+from collections import Counter
+from contextlib import contextmanager
+import re
+from time import perf_counter
+import sqlalchemy as sa
+from flask import g, has_request_context
+from app import db
+
+_trackers = []
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = []
+        self.shapes = Counter()
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        self.statements.append(statement)
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold):
+        return {shape: count for shape, count in self.shapes.items()
+                if count >= threshold}
+
+
+def statement_shape(statement):
+    # statements that only differ in their parameters have the same shape,
+    # including IN lists of different lengths and inline literals
+    shape = re.sub(r"'(?:[^']|'')*'", '?', statement)
+    shape = re.sub(r'\b\d+(\.\d+)?\b', '?', shape)
+    shape = re.sub(r'\(\s*\?(\s*,\s*\?)*\s*\)', '(?)', shape)
+    return ' '.join(shape.split())
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    # the start time is kept on the execution context, which is discarded
+    # together with it when the statement fails
+    context._query_start = perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    duration = perf_counter() - context._query_start
+    for stats in _trackers:
+        stats.record(statement, duration)
+    if has_request_context() and 'query_stats' in g:
+        g.query_stats.record(statement, duration)
+
+
+def install(engine):
+    if not sa.event.contains(engine, 'before_cursor_execute',
+                             _before_cursor_execute):
+        sa.event.listen(engine, 'before_cursor_execute',
+                        _before_cursor_execute)
+        sa.event.listen(engine, 'after_cursor_execute',
+                        _after_cursor_execute)
+
+
+@contextmanager
+def track_queries():
+    # the statements of all threads are recorded, so this is meant to be
+    # used in tests and other single threaded code
+    install(db.engine)
+    stats = QueryStats()
+    _trackers.append(stats)
+    try:
+        yield stats
+    finally:
+        _trackers.remove(stats)
+
+
+@contextmanager
+def max_queries(limit):
+    with track_queries() as stats:
+        yield stats
+    if stats.count > limit:
+        raise AssertionError(
+            '{} queries executed, the limit is {}:\n{}'.format(
+                stats.count, limit, '\n'.join(stats.statements)))
+
+
+def init_app(app):
+    if not app.config['SQL_QUERY_STATS']:
+        return
+    with app.app_context():
+        install(db.engine)
+
+    @app.before_request
+    def start_query_stats():
+        g.query_stats = QueryStats()
+
+    @app.after_request
+    def report_query_stats(response):
+        stats = g.pop('query_stats', None)
+        if stats is None:
+            return response
+        response.headers['X-SQL-Query-Count'] = str(stats.count)
+        response.headers['X-SQL-Query-Time'] = '{:.6f}'.format(
+            stats.duration)
+        repeated = stats.repeated(app.config['SQL_N_PLUS_ONE_THRESHOLD'])
+        for shape, count in repeated.items():
+            app.logger.warning('Possible N+1 query, executed %d times: %s',
+                               count, shape)
+        return response
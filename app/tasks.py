@@ -1,15 +1,18 @@
-import json
+from datetime import datetime, timezone
+import gzip
+import shutil
 import sys
-import time
-import sqlalchemy as sa
+import tempfile
 from flask import render_template
 from rq import get_current_job
 from app import create_app, db
-from app.models import User, Post, Task
+from app.models import User, Task
 from app.email import send_email
+from app import export, languages, maintenance, search
 
 app = create_app()
 app.app_context().push()
+languages.load_profiles()
 
 
 def _set_task_progress(progress):
@@ -22,35 +25,63 @@ def _set_task_progress(progress):
                                                      'progress': progress})
         if progress >= 100:
             task.complete = True
+            task.completed_at = datetime.now(timezone.utc)
         db.session.commit()
 
 
+def _write_export(user, f):
+    rows = export.report_progress(
+        export.post_rows(user.id, app.config['EXPORT_BATCH_SIZE']),
+        user.posts_count(), _set_task_progress)
+    for chunk in export.json_chunks(rows):
+        f.write(chunk.encode('utf-8'))
+    if f.tell() <= app.config['EXPORT_GZIP_THRESHOLD']:
+        f.seek(0)
+        return ('posts.json', 'application/json', f.read())
+    f.seek(0)
+    with tempfile.TemporaryFile() as compressed:
+        with gzip.GzipFile(filename='posts.json', mode='wb',
+                           fileobj=compressed) as gz:
+            shutil.copyfileobj(f, gz)
+        compressed.seek(0)
+        return ('posts.json.gz', 'application/gzip', compressed.read())
+
+
 def export_posts(user_id):
     try:
         user = db.session.get(User, user_id)
         _set_task_progress(0)
-        data = []
-        i = 0
-        total_posts = db.session.scalar(sa.select(sa.func.count()).select_from(
-            user.posts.select().subquery()))
-        for post in db.session.scalars(user.posts.select().order_by(
-                Post.timestamp.asc())):
-            data.append({'body': post.body,
-                         'timestamp': post.timestamp.isoformat() + 'Z'})
-            time.sleep(5)
-            i += 1
-            _set_task_progress(100 * i // total_posts)
+        with tempfile.TemporaryFile() as f:
+            attachment = _write_export(user, f)
 
         send_email(
             '[Microblog] Your blog posts',
             sender=app.config['ADMINS'][0], recipients=[user.email],
             text_body=render_template('email/export_posts.txt', user=user),
             html_body=render_template('email/export_posts.html', user=user),
-            attachments=[('posts.json', 'application/json',
-                          json.dumps({'posts': data}, indent=4))],
+            attachments=[attachment],
             sync=True)
     except Exception:
         _set_task_progress(100)
         app.logger.error('Unhandled exception', exc_info=sys.exc_info())
     finally:
         _set_task_progress(100)
+
+
+def process_search_queue():
+    search.process_queue()
+
+
+def refresh_search_query(index, query, page, per_page):
+    search.refresh_query(index, query, page, per_page)
+
+
+def detect_languages(ids):
+    languages.detect_post_languages(ids)
+
+
+def run_maintenance():
+    try:
+        return maintenance.run_maintenance()
+    finally:
+        maintenance.schedule_maintenance()
@@ -1,21 +1,221 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from hashlib import sha256
+from time import time
 import requests
+from requests.adapters import HTTPAdapter
+import sqlalchemy as sa
 from flask import current_app
 from flask_babel import _
+from app import db
+from app.models import Translation
 
+_session = None
+_inserts = 0
 
-def translate(text, source_language, dest_language):
+
+class TranslationError(Exception):
+    pass
+
+
+def _get_session():
+    # a single session keeps the connections to the translator alive
+    # between requests instead of opening a new one for every call
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        _session.mount('https://', HTTPAdapter(
+            pool_maxsize=current_app.config['TRANSLATOR_POOL_SIZE']))
+    return _session
+
+
+def translation_key(text, source_language, dest_language):
+    return sha256('\0'.join([source_language, dest_language, text]).encode(
+        'utf-8')).hexdigest()
+
+
+def _check_configured():
     if 'MS_TRANSLATOR_KEY' not in current_app.config or \
             not current_app.config['MS_TRANSLATOR_KEY']:
-        return _('Error: the translation service is not configured.')
+        raise TranslationError(
+            _('Error: the translation service is not configured.'))
+
+
+def _post_texts(session, api_key, timeout, texts, source_language,
+                dest_language):
+    # this does not use the application context, so that it can run in
+    # worker threads
     auth = {
-        'Ocp-Apim-Subscription-Key': current_app.config['MS_TRANSLATOR_KEY'],
+        'Ocp-Apim-Subscription-Key': api_key,
         'Ocp-Apim-Subscription-Region': 'westus'
     }
-    r = requests.post(
+    r = session.post(
         'https://api.cognitive.microsofttranslator.com'
         '/translate?api-version=3.0&from={}&to={}'.format(
             source_language, dest_language), headers=auth, json=[
-                {'Text': text}])
+                {'Text': text} for text in texts], timeout=timeout)
     if r.status_code != 200:
-        return _('Error: the translation service failed.')
-    return r.json()[0]['translations'][0]['text']
+        raise requests.HTTPError(f'status code {r.status_code}')
+    return [item['translations'][0]['text'] for item in r.json()]
+
+
+def request_translations(texts, source_language, dest_language):
+    _check_configured()
+    try:
+        return _post_texts(_get_session(),
+                           current_app.config['MS_TRANSLATOR_KEY'],
+                           current_app.config['TRANSLATOR_TIMEOUT'],
+                           texts, source_language, dest_language)
+    except requests.RequestException:
+        raise TranslationError(_('Error: the translation service failed.'))
+
+
+def cached_translations(keys):
+    # hits in the front cache also count as uses, but to keep them from
+    # writing to the database every time, last_used is only updated when
+    # the previous update is older than TRANSLATION_TOUCH_INTERVAL
+    translations = {}
+    touch = []
+    now = time()
+    for key in keys:
+        entry = current_app.cache.get('translation-entry:' + key)
+        if entry is not None:
+            text, touched_at = entry
+            translations[key] = text
+            if now - touched_at > \
+                    current_app.config['TRANSLATION_TOUCH_INTERVAL']:
+                touch.append(key)
+    missing = [key for key in keys if key not in translations]
+    if missing:
+        found = db.session.execute(sa.select(
+            Translation.key, Translation.text).where(
+                Translation.key.in_(missing))).all()
+        for key, text in found:
+            translations[key] = text
+            touch.append(key)
+    if touch:
+        db.session.execute(sa.update(Translation).where(
+            Translation.key.in_(touch)).values(
+                last_used=datetime.now(timezone.utc)))
+        db.session.commit()
+        for key in touch:
+            _remember(key, translations[key])
+    return translations
+
+
+def _remember(key, text):
+    current_app.cache.set(
+        'translation-entry:' + key, (text, time()),
+        timeout=current_app.config['TRANSLATION_CACHE_TIMEOUT'])
+
+
+def store_translations(translations):
+    # translations is a list of (key, source_language, dest_language, text)
+    global _inserts
+    for key, source_language, dest_language, text in translations:
+        db.session.merge(Translation(
+            key=key, source_language=source_language,
+            dest_language=dest_language, text=text,
+            last_used=datetime.now(timezone.utc)))
+        _remember(key, text)
+    try:
+        db.session.commit()
+    except sa.exc.IntegrityError:
+        # another request stored the same translation first
+        db.session.rollback()
+    _inserts += len(translations)
+    if _inserts >= current_app.config['TRANSLATION_CACHE_PRUNE_INTERVAL']:
+        _inserts = 0
+        prune_translations(current_app.config['TRANSLATION_CACHE_MAX_ENTRIES'])
+
+
+def prune_translations(max_entries):
+    # least recently used translations beyond the limit are deleted
+    cutoff = db.session.scalar(
+        sa.select(Translation.last_used)
+        .order_by(Translation.last_used.desc()).offset(max_entries).limit(1))
+    if cutoff is None:
+        return 0
+    result = db.session.execute(sa.delete(Translation).where(
+        Translation.last_used <= cutoff))
+    db.session.commit()
+    return result.rowcount
+
+
+def translate(text, source_language, dest_language):
+    key = translation_key(text, source_language, dest_language)
+    cached = cached_translations([key])
+    if key in cached:
+        return cached[key]
+    try:
+        translation = request_translations([text], source_language,
+                                           dest_language)[0]
+    except TranslationError as exc:
+        return str(exc)
+    store_translations([(key, source_language, dest_language, translation)])
+    return translation
+
+
+def translate_batch(items):
+    # items are dicts with id, text, source and dest keys, the result is a
+    # dict that maps ids to their translations and one that maps the ids
+    # that could not be translated to an error message
+    keys = {item['id']: translation_key(item['text'], item['source'],
+                                        item['dest']) for item in items}
+    translations = cached_translations(list(set(keys.values())))
+    groups = {}
+    for item in items:
+        key = keys[item['id']]
+        if key not in translations:
+            groups.setdefault((item['source'], item['dest']), {})[key] = \
+                item['text']
+    if groups:
+        try:
+            _check_configured()
+        except TranslationError as exc:
+            return _split_results(keys, translations, str(exc))
+        # texts with the same language pair are sent together, in requests
+        # of up to TRANSLATOR_BATCH_SIZE texts that run concurrently
+        size = current_app.config['TRANSLATOR_BATCH_SIZE']
+        calls = []
+        for (source, dest), texts in groups.items():
+            texts = list(texts.items())
+            for i in range(0, len(texts), size):
+                calls.append((source, dest, texts[i:i + size]))
+        session = _get_session()
+        api_key = current_app.config['MS_TRANSLATOR_KEY']
+        timeout = current_app.config['TRANSLATOR_TIMEOUT']
+
+        def send(call):
+            source, dest, texts = call
+            try:
+                return _post_texts(session, api_key, timeout,
+                                   [text for key, text in texts], source,
+                                   dest)
+            except requests.RequestException:
+                return None
+
+        with ThreadPoolExecutor(
+                current_app.config['TRANSLATOR_BATCH_WORKERS']) as executor:
+            results = list(executor.map(send, calls))
+        new = []
+        for (source, dest, texts), result in zip(calls, results):
+            if result is None:
+                continue
+            for (key, text), translation in zip(texts, result):
+                translations[key] = translation
+                new.append((key, source, dest, translation))
+        if new:
+            store_translations(new)
+    return _split_results(keys, translations, None)
+
+
+def _split_results(keys, translations, error):
+    done = {id: translations[key] for id, key in keys.items()
+            if key in translations}
+    if len(done) < len(keys):
+        # the message is only translated when it is needed, as it requires
+        # a request context
+        error = error or _('Error: the translation service failed.')
+    failed = {id: error for id in keys if id not in done}
+    return done, failed
@@ -0,0 +1,17 @@
+# Settings for "rq worker -c app.worker_settings". The worker imports this
+# module before it forks the processes that run the jobs, so what is loaded
+# here is shared by all of them instead of being loaded for every job.
+import os
+from app import create_app
+from app.languages import load_profiles
+from app.maintenance import schedule_maintenance
+
+REDIS_URL = os.environ.get('REDIS_URL') or 'redis://'
+
+load_profiles()
+
+# starting a worker also starts the maintenance job chain, or restarts it
+# if a worker died while running the job, scheduling does nothing when a
+# run is already pending
+with create_app().app_context():
+    schedule_maintenance()
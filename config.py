@@ -20,6 +20,65 @@ class Config:
     ADMINS = ['your-email@example.com']
     LANGUAGES = ['en', 'es']
     MS_TRANSLATOR_KEY = os.environ.get('MS_TRANSLATOR_KEY')
+    LANGUAGE_DETECTION_SYNC = \
+        os.environ.get('LANGUAGE_DETECTION_SYNC') is not None
+    TRANSLATOR_TIMEOUT = (3.05, 10)
+    TRANSLATOR_POOL_SIZE = int(os.environ.get('TRANSLATOR_POOL_SIZE') or 10)
+    TRANSLATOR_BATCH_SIZE = 100
+    TRANSLATOR_BATCH_WORKERS = 4
+    TRANSLATE_BATCH_MAX_ITEMS = 100
+    TRANSLATION_CACHE_TIMEOUT = int(
+        os.environ.get('TRANSLATION_CACHE_TIMEOUT') or 86400)
+    TRANSLATION_CACHE_MAX_ENTRIES = int(
+        os.environ.get('TRANSLATION_CACHE_MAX_ENTRIES') or 100000)
+    TRANSLATION_CACHE_PRUNE_INTERVAL = 100
+    TRANSLATION_TOUCH_INTERVAL = 3600
     ELASTICSEARCH_URL = os.environ.get('ELASTICSEARCH_URL')
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND') or \
+        ('elasticsearch' if os.environ.get('ELASTICSEARCH_URL')
+         else 'database')
+    SEARCH_STORE_DOCUMENTS = \
+        os.environ.get('SEARCH_STORE_DOCUMENTS') is not None
+    SEARCH_INDEX_SYNC = os.environ.get('SEARCH_INDEX_SYNC') is not None
+    SEARCH_INDEX_BATCH_SIZE = int(os.environ.get('SEARCH_INDEX_BATCH_SIZE')
+                                  or 500)
+    SEARCH_INDEX_MAX_ATTEMPTS = 5
+    SEARCH_INDEX_RETRY_DELAY = 30
+    SEARCH_CACHE_TIMEOUT = int(os.environ.get('SEARCH_CACHE_TIMEOUT') or 60)
+    SEARCH_CACHE_REFRESH_AFTER = int(
+        os.environ.get('SEARCH_CACHE_REFRESH_AFTER') or 30)
     REDIS_URL = os.environ.get('REDIS_URL') or 'redis://'
+    # the memory cache is private to each process, so it is only suitable
+    # for a single worker
+    CACHE_TYPE = os.environ.get('CACHE_TYPE') or \
+        ('redis' if REDIS_URL else 'memory')
+    CACHE_DEFAULT_TIMEOUT = int(os.environ.get('CACHE_DEFAULT_TIMEOUT') or 300)
+    CACHE_TAG_TIMEOUT = int(os.environ.get('CACHE_TAG_TIMEOUT') or 86400)
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES') or 10000)
+    USER_CACHE_TIMEOUT = int(os.environ.get('USER_CACHE_TIMEOUT') or 60)
+    API_TOKEN_TYPE = os.environ.get('API_TOKEN_TYPE') or 'opaque'
+    TOKEN_DENYLIST_BACKEND = os.environ.get('TOKEN_DENYLIST_BACKEND') or \
+        ('redis' if REDIS_URL else 'memory')
+    PRESENCE_BACKEND = os.environ.get('PRESENCE_BACKEND') or \
+        ('redis' if REDIS_URL else 'memory')
+    PRESENCE_FLUSH_INTERVAL = int(os.environ.get('PRESENCE_FLUSH_INTERVAL')
+                                  or 60)
+    PRESENCE_ONLINE_WINDOW = int(os.environ.get('PRESENCE_ONLINE_WINDOW')
+                                 or 300)
+    NOTIFICATION_BACKEND = os.environ.get('NOTIFICATION_BACKEND') or \
+        ('redis' if os.environ.get('REDIS_URL') else 'sql')
+    NOTIFICATION_TIMEOUT = 7 * 86400
+    NOTIFICATION_STREAM = os.environ.get('NOTIFICATION_STREAM') is not None
+    NOTIFICATION_STREAM_TIMEOUT = 300
+    NOTIFICATION_STREAM_KEEPALIVE = 15
+    NOTIFICATION_RETENTION = {'task_progress': 7 * 86400}
+    NOTIFICATION_RETENTION_DEFAULT = 30 * 86400
+    TASK_RETENTION = 30 * 86400
+    MAINTENANCE_INTERVAL = 3600
+    MAINTENANCE_BATCH_SIZE = 1000
+    EXPORT_BATCH_SIZE = 1000
+    EXPORT_GZIP_THRESHOLD = 1024 * 1024
     POSTS_PER_PAGE = 25
+    SQL_QUERY_STATS = os.environ.get('SQL_QUERY_STATS') is not None
+    SQL_N_PLUS_ONE_THRESHOLD = int(os.environ.get('SQL_N_PLUS_ONE_THRESHOLD')
+                                   or 5)
@@ -0,0 +1,33 @@
+"""post full-text search
+
+Revision ID: 6c2f8e1d4b97
+Revises: 9b41c6d2e0f3
+Create Date: 2026-10-18 18:02:44.517230
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '6c2f8e1d4b97'
+down_revision = '9b41c6d2e0f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute('CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5(body)')
+        op.execute('INSERT INTO post_fts (rowid, body) SELECT id, body FROM post')
+    elif dialect == 'postgresql':
+        op.execute("CREATE INDEX IF NOT EXISTS ix_post_fulltext ON \"post\" "
+                   "USING gin (to_tsvector('simple', coalesce(body, '')))")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS post_fts')
+    elif dialect == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_post_fulltext')
@@ -2,7 +2,7 @@
 from datetime import datetime, timezone, timedelta
 import unittest
 from app import create_app, db
-from app.models import User, Post
+from app.models import User, Post, Message
 from config import Config
 
 
@@ -10,6 +10,10 @@ class TestConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite://'
     ELASTICSEARCH_URL = None
+    CACHE_TYPE = 'null'
+    PRESENCE_BACKEND = 'memory'
+    LANGUAGE_DETECTION_SYNC = True
+    NOTIFICATION_BACKEND = 'sql'
 
 
 class UserModelCase(unittest.TestCase):
@@ -63,6 +67,62 @@ class UserModelCase(unittest.TestCase):
         self.assertEqual(u1.following_count(), 0)
         self.assertEqual(u2.followers_count(), 0)
 
+    def test_counters(self):
+        u1 = User(username='john', email='john@example.com')
+        u2 = User(username='susan', email='susan@example.com')
+        p1 = Post(body="post from john", author=u1)
+        p2 = Post(body="another post from john", author=u1)
+        db.session.add_all([u1, u2, p1, p2])
+        db.session.commit()
+        self.assertEqual(u1.posts_count(), 2)
+        self.assertEqual(u2.posts_count(), 0)
+
+        db.session.delete(p1)
+        u2.follow(u1)
+        db.session.commit()
+        self.assertEqual(u1.posts_count(), 1)
+        self.assertEqual(u1.followers_count(), 1)
+        self.assertEqual(u2.following_count(), 1)
+
+        # counters that drifted are fixed by a reconcile
+        u1.posts_total = 10
+        u2.followers_total = 3
+        db.session.commit()
+        User.reconcile_counters()
+        db.session.commit()
+        self.assertEqual(u1.posts_count(), 1)
+        self.assertEqual(u1.followers_count(), 1)
+        self.assertEqual(u2.followers_count(), 0)
+        self.assertEqual(u2.following_count(), 1)
+
+    def test_unread_message_count(self):
+        u1 = User(username='john', email='john@example.com')
+        u2 = User(username='susan', email='susan@example.com')
+        db.session.add_all([u1, u2])
+        db.session.add(Message(author=u1, recipient=u2, body='hi'))
+        db.session.commit()
+        self.assertEqual(u2.unread_message_count(), 1)
+
+        db.session.add_all([Message(author=u1, recipient=u2, body='hi'),
+                            Message(author=u1, recipient=u2, body='there')])
+        db.session.commit()
+        self.assertEqual(u2.unread_message_count(), 3)
+        self.assertEqual(u1.unread_message_count(), 0)
+
+        u2.mark_messages_read()
+        db.session.commit()
+        self.assertEqual(u2.unread_message_count(), 0)
+
+        # the counter is rebuilt from the last message read time
+        u2.unread_messages = 5
+        db.session.add(Message(author=u1, recipient=u2, body='again',
+                               timestamp=datetime.now(timezone.utc) +
+                               timedelta(seconds=1)))
+        db.session.commit()
+        User.reconcile_counters()
+        db.session.commit()
+        self.assertEqual(u2.unread_message_count(), 1)
+
     def test_follow_posts(self):
         # create four users
         u1 = User(username='john', email='john@example.com')
@@ -101,6 +161,59 @@ class UserModelCase(unittest.TestCase):
         self.assertEqual(f3, [p3, p4])
         self.assertEqual(f4, [p4])
 
+    def test_timeline_follow_unfollow(self):
+        u1 = User(username='john', email='john@example.com')
+        u2 = User(username='susan', email='susan@example.com')
+        db.session.add_all([u1, u2])
+        now = datetime.now(timezone.utc)
+        p1 = Post(body="post from susan", author=u2,
+                  timestamp=now + timedelta(seconds=1))
+        db.session.add(p1)
+        db.session.commit()
+
+        # following backfills the existing posts of the followed user
+        u1.follow(u2)
+        db.session.commit()
+        self.assertEqual(db.session.scalars(u1.following_posts()).all(), [p1])
+
+        # new posts fan out to the followers
+        p2 = Post(body="another post from susan", author=u2,
+                  timestamp=now + timedelta(seconds=2))
+        db.session.add(p2)
+        db.session.commit()
+        self.assertEqual(db.session.scalars(u1.following_posts()).all(),
+                         [p2, p1])
+
+        # deleted posts are removed from all timelines
+        db.session.delete(p1)
+        db.session.commit()
+        self.assertEqual(db.session.scalars(u1.following_posts()).all(), [p2])
+
+        # unfollowing prunes the timeline
+        u1.unfollow(u2)
+        db.session.commit()
+        self.assertEqual(db.session.scalars(u1.following_posts()).all(), [])
+        self.assertEqual(db.session.scalars(u2.following_posts()).all(), [p2])
+
+    def test_rebuild_timelines(self):
+        u1 = User(username='john', email='john@example.com')
+        u2 = User(username='susan', email='susan@example.com')
+        db.session.add_all([u1, u2])
+        now = datetime.now(timezone.utc)
+        p1 = Post(body="post from john", author=u1,
+                  timestamp=now + timedelta(seconds=1))
+        p2 = Post(body="post from susan", author=u2,
+                  timestamp=now + timedelta(seconds=2))
+        db.session.add_all([p1, p2])
+        u1.follow(u2)
+        db.session.commit()
+
+        User.rebuild_timelines()
+        db.session.commit()
+        self.assertEqual(db.session.scalars(u1.following_posts()).all(),
+                         [p2, p1])
+        self.assertEqual(db.session.scalars(u2.following_posts()).all(), [p2])
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)
@@ -2,6 +2,7 @@ import pytest
 
 from app import create_app, db
 from app.models import User
+from app.sqlstats import max_queries
 from config import Config
 
 
@@ -9,6 +10,11 @@ class TestConfig(Config):
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
     WTF_CSRF_ENABLED = False
     TESTING = True
+    PRESENCE_BACKEND = "memory"
+    CACHE_TYPE = "null"
+    TOKEN_DENYLIST_BACKEND = "memory"
+    LANGUAGE_DETECTION_SYNC = True
+    NOTIFICATION_BACKEND = "sql"
 
 
 @pytest.fixture(scope="session")
@@ -27,6 +33,11 @@ def client(app):
         db.drop_all()
 
 
+@pytest.fixture
+def query_budget(client):
+    return max_queries
+
+
 @pytest.fixture
 def user(client):
     user = User(username="testuser", email="testuser@example.com")
@@ -1,7 +1,12 @@
 from base64 import b64encode
 
+import pytest
+
 from app import db
+from app.cache import MemoryCache
+from app.denylist import create_denylist
 from app.models import User
+from app.sqlstats import track_queries
 
 
 def test_generate_token_with_valid_credentials(client):
@@ -55,3 +60,61 @@ def test_revoke_token_with_invalid_token_returns_401(client):
         headers={"Authorization": "Bearer invalid-token"}
     )
     assert response.status_code == 401
+
+
+def test_signed_token_lifecycle(app, client, user, monkeypatch):
+    monkeypatch.setitem(app.config, "API_TOKEN_TYPE", "signed")
+    credentials = b64encode(b"testuser:TestPass2024!").decode("utf-8")
+    response = client.post(
+        "/api/tokens",
+        headers={"Authorization": f"Basic {credentials}"}
+    )
+    token = response.get_json()["token"]
+    assert db.session.get(User, user.id).token is None
+    headers = {"Authorization": f"Bearer {token}"}
+
+    url = f"/api/users/{user.id}"
+    assert client.get(url, headers=headers).status_code == 200
+    assert client.delete("/api/tokens", headers=headers).status_code == 204
+    assert client.get(url, headers=headers).status_code == 401
+
+
+def test_opaque_token_accepted_in_signed_mode(app, client, user, auth_headers,
+                                              monkeypatch):
+    monkeypatch.setitem(app.config, "API_TOKEN_TYPE", "signed")
+    response = client.get(f"/api/users/{user.id}", headers=auth_headers)
+    assert response.status_code == 200
+
+
+def test_reset_password_token_is_not_an_api_token(client, user):
+    token = user.get_reset_password_token()
+    response = client.get(
+        f"/api/users/{user.id}",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 401
+
+
+def test_memory_denylist_refused_in_production(app, monkeypatch):
+    monkeypatch.setitem(app.config, "TESTING", False)
+    with pytest.raises(RuntimeError):
+        create_denylist(app)
+
+
+def test_signed_token_user_served_from_cache(app, client, user,
+                                             monkeypatch):
+    monkeypatch.setitem(app.config, "API_TOKEN_TYPE", "signed")
+    monkeypatch.setattr(app, "cache", MemoryCache())
+    token = user.get_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    url = f"/api/users/{user.id}"
+    db.session.commit()
+    db.session.expunge_all()
+    assert client.get(url, headers=headers).status_code == 200
+    db.session.expunge_all()
+
+    with track_queries() as stats:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert not any("FROM user" in statement
+                   for statement in stats.statements)
@@ -1,4 +1,5 @@
 import json
+from time import time
 
 from app import db
 from app.models import User
@@ -177,3 +178,56 @@ def test_update_other_user_profile_returns_403(client, user, auth_headers):
         headers=auth_headers2,
     )
     assert response.status_code == 403
+
+
+def test_get_users_list_cursor_pagination(client, auth_headers):
+    for i in range(3):
+        db.session.add(User(username=f"u{i}", email=f"u{i}@example.com"))
+    db.session.commit()
+
+    response = client.get("/api/users?per_page=2", headers=auth_headers)
+    data = response.get_json()
+    assert [u["username"] for u in data["items"]] == ["testuser", "u0"]
+    assert data["_meta"] == {"per_page": 2, "page": 1, "total_pages": 2,
+                             "total_items": 4}
+    assert data["_links"]["prev"] is None
+
+    response = client.get(data["_links"]["next"], headers=auth_headers)
+    data = response.get_json()
+    assert [u["username"] for u in data["items"]] == ["u1", "u2"]
+    assert data["_meta"] == {"per_page": 2}
+    assert data["_links"]["next"] is None
+
+    response = client.get(data["_links"]["prev"], headers=auth_headers)
+    data = response.get_json()
+    assert [u["username"] for u in data["items"]] == ["testuser", "u0"]
+    assert data["_links"]["prev"] is None
+
+
+def test_get_users_list_without_page_matches_first_page(client,
+                                                        auth_headers):
+    for i in range(3):
+        db.session.add(User(username=f"u{i}", email=f"u{i}@example.com"))
+    db.session.commit()
+
+    data = client.get("/api/users?per_page=2",
+                      headers=auth_headers).get_json()
+    paged = client.get("/api/users?per_page=2&page=1",
+                       headers=auth_headers).get_json()
+    assert data["items"] == paged["items"]
+    assert data["_meta"] == paged["_meta"]
+
+
+def test_get_users_list_page_pagination(client, auth_headers):
+    response = client.get("/api/users?page=1", headers=auth_headers)
+    data = response.get_json()
+    assert data["_meta"]["page"] == 1
+    assert data["_meta"]["total_items"] == 1
+
+
+def test_get_online_users(app, client, user, second_user, auth_headers):
+    app.presence.record(second_user.id, time())
+    response = client.get("/api/users/online", headers=auth_headers)
+    assert response.status_code == 200
+    usernames = [u["username"] for u in response.get_json()["items"]]
+    assert "otheruser" in usernames
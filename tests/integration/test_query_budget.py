@@ -0,0 +1,44 @@
+from app import db
+from app.models import Post, User
+from tests.conftest import login_user_via_client
+
+
+def _create_users(count):
+    users = [User(username=f"u{i}", email=f"u{i}@example.com")
+             for i in range(count)]
+    db.session.add_all(users)
+    db.session.commit()
+    return users
+
+
+def test_index_query_budget(client, user, query_budget):
+    users = _create_users(10)
+    for other in users:
+        user.follow(other)
+        db.session.add(Post(body=f"post from {other.username}", author=other))
+    db.session.commit()
+    login_user_via_client(client, "testuser", "TestPass2024!")
+
+    with query_budget(6):
+        response = client.get("/index")
+    assert response.status_code == 200
+
+
+def test_explore_query_budget(client, user, query_budget):
+    for other in _create_users(10):
+        db.session.add(Post(body=f"post from {other.username}", author=other))
+    db.session.commit()
+    login_user_via_client(client, "testuser", "TestPass2024!")
+
+    with query_budget(6):
+        response = client.get("/explore")
+    assert response.status_code == 200
+
+
+def test_api_users_query_budget(client, auth_headers, query_budget):
+    _create_users(100)
+
+    with query_budget(3):
+        response = client.get("/api/users?per_page=100",
+                              headers=auth_headers)
+    assert response.status_code == 200
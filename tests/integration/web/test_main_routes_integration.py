@@ -1,7 +1,13 @@
+import json
+import re
+from datetime import datetime, timedelta, timezone
+
 import sqlalchemy as sa
 
 from app import db
 from app.models import Message, Post, User
+from app.pagination import encode_cursor
+from app.search import ElasticsearchBackend
 from tests.conftest import login_user_via_client
 
 
@@ -60,3 +66,107 @@ def test_send_message(client, user):
         )
     )
     assert message.body == "hi"
+
+
+def test_explore_cursor_pagination(client, user):
+    now = datetime.now(timezone.utc)
+    for i in range(30):
+        db.session.add(Post(body=f"post {i}", author=user,
+                            timestamp=now + timedelta(seconds=i)))
+    db.session.commit()
+
+    login_user_via_client(client, "testuser", "TestPass2024!")
+    html = client.get("/explore").get_data(as_text=True)
+    assert "post 29" in html and "post 5" in html and "post 4" not in html
+
+    next_url = re.search(r'href="(/explore\?before=[^"]+)"', html).group(1)
+    html = client.get(next_url).get_data(as_text=True)
+    assert "post 4" in html and "post 0" in html and "post 5" not in html
+
+    prev_url = re.search(r'href="(/explore\?after=[^"]+)"', html).group(1)
+    html = client.get(prev_url).get_data(as_text=True)
+    assert "post 29" in html and "post 5" in html and "post 4" not in html
+
+    html = client.get("/explore?page=2").get_data(as_text=True)
+    assert "post 4" in html and "post 5" not in html
+
+
+def test_explore_invalid_cursor_returns_400(client, user):
+    login_user_via_client(client, "testuser", "TestPass2024!")
+    assert client.get("/explore?before=garbage").status_code == 400
+
+
+def test_cursor_values_of_the_wrong_type_return_400(client, user,
+                                                    auth_headers):
+    login_user_via_client(client, "testuser", "TestPass2024!")
+    for values in ([{}, 1], ["2024-01-01T00:00:00", "1"],
+                   ["2024-01-01T00:00:00", True]):
+        cursor = encode_cursor(values)
+        assert client.get(f"/explore?before={cursor}").status_code == 400
+    for values in ([{}], ["1"], [True], [[1]]):
+        cursor = encode_cursor(values)
+        assert client.get(f"/api/users?after={cursor}",
+                          headers=auth_headers).status_code == 400
+
+
+def test_search_invalid_cursor_returns_400(app, client, user, monkeypatch):
+    monkeypatch.setitem(app.config, "SEARCH_STORE_DOCUMENTS", True)
+    monkeypatch.setattr(app, "search_backend", ElasticsearchBackend())
+    login_user_via_client(client, "testuser", "TestPass2024!")
+    for cursor in ("garbage", encode_cursor(["1", {}])):
+        response = client.get(f"/search?q=post&after={cursor}")
+        assert response.status_code == 400
+
+
+def test_translate_batch(client, user):
+    login_user_via_client(client, "testuser", "TestPass2024!")
+    response = client.post("/translate/batch", json={"items": [
+        {"id": 1, "text": "hola", "source": "es", "dest": "en"},
+        {"id": 2, "text": "hola", "source": "es", "dest": "en"},
+    ]})
+    assert response.status_code == 200
+    error = "Error: the translation service is not configured."
+    assert response.get_json() == {"translations": [], "errors": [
+        {"id": 1, "error": error}, {"id": 2, "error": error}]}
+
+    assert client.post("/translate/batch", json={"items": [
+        {"id": 1, "text": 5, "source": "es", "dest": "en"}]}).status_code \
+        == 400
+    assert client.post("/translate/batch", json=[]).status_code == 400
+
+
+def test_notification_stream_unavailable(app, client, user, monkeypatch):
+    login_user_via_client(client, "testuser", "TestPass2024!")
+    assert client.get("/notifications/stream").status_code == 404
+
+    monkeypatch.setitem(app.config, "NOTIFICATION_STREAM", True)
+    # there is no redis server in the tests, so the page has to poll
+    assert client.get("/notifications/stream").status_code == 503
+    assert client.get("/notifications").status_code == 200
+
+
+def test_download_posts(client, user):
+    other = User(username="other", email="other@example.com")
+    start = datetime(2024, 1, 1)
+    db.session.add_all([other, Post(body="not mine", author=other)])
+    db.session.add_all([Post(body=f"post {i}", author=user,
+                             timestamp=start + timedelta(minutes=i))
+                        for i in range(3)])
+    db.session.commit()
+    login_user_via_client(client, "testuser", "TestPass2024!")
+
+    response = client.get("/export_posts/download")
+    assert response.status_code == 200
+    assert response.mimetype == "application/json"
+    assert response.headers["Content-Disposition"] == \
+        "attachment; filename=posts.json"
+    assert [p["body"] for p in response.get_json()["posts"]] == [
+        "post 0", "post 1", "post 2"]
+
+    response = client.get("/export_posts/download?format=ndjson")
+    assert response.mimetype == "application/x-ndjson"
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line)["body"] for line in lines] == [
+        "post 0", "post 1", "post 2"]
+
+    assert client.get("/export_posts/download?format=xml").status_code == 400
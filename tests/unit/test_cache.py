@@ -0,0 +1,95 @@
+from time import time
+
+from app import db
+from app.cache import MemoryCache, NullCache
+from app.models import Post, User
+
+
+def test_memory_cache_get_set_and_expiration():
+    cache = MemoryCache()
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    cache.set("b", 2, timeout=-1)
+    assert cache.get("b") is None
+    cache.delete("a")
+    assert cache.get("a") is None
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_memory_cache_tag_invalidation():
+    cache = MemoryCache()
+    cache.set("a", 1, tags=["user:1"])
+    cache.set("b", 2, tags=["user:1", "post:feed"])
+    cache.set("c", 3, tags=["user:2"])
+    cache.invalidate("user:1")
+    assert cache.get("a") is None
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    cache.set("a", 4, tags=["user:1"])
+    assert cache.get("a") == 4
+
+
+def test_memory_cache_forgets_old_tag_versions():
+    cache = MemoryCache(tag_timeout=60)
+    cache.set("a", 1, timeout=300, tags=["user:1"])
+    assert cache.entries["a"][0] <= time() + 60
+    cache.invalidate("user:1", "user:2")
+    assert cache.get("a") is None
+    cache.set("a", 2, tags=["user:1"])
+    assert cache.get("a") == 2
+
+    cache.versions["user:1"] = (1, time() - 1)
+    cache.invalidate("user:3")
+    assert list(cache.versions) == ["user:2", "user:3"]
+    # the entry was written with version 1, so it stays invalid
+    assert cache.get("a") is None
+
+
+def test_null_cache_never_stores():
+    cache = NullCache()
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+def test_commit_invalidates_model_tags(app, client, monkeypatch):
+    monkeypatch.setattr(app, "cache", MemoryCache())
+    calls = []
+
+    def about(user):
+        value = app.cache.get(f"about:{user.id}")
+        if value is None:
+            calls.append(user.id)
+            value = user.about_me
+            app.cache.set(f"about:{user.id}", value,
+                          tags=[f"user:{user.id}"])
+        return value
+
+    user = User(username="u", email="u@example.com", about_me="first")
+    db.session.add(user)
+    db.session.commit()
+    assert about(user) == "first"
+    assert about(user) == "first"
+    assert len(calls) == 1
+
+    user.about_me = "second"
+    db.session.commit()
+    assert about(user) == "second"
+    assert len(calls) == 2
+
+    app.cache.set("feed", [1], tags=["post:feed"])
+    db.session.add(Post(body="hello", author=user))
+    db.session.commit()
+    assert app.cache.get("feed") is None
+    # the post counter update invalidates the author as well
+    assert about(user) == "second"
+    assert len(calls) == 3
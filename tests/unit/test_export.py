@@ -0,0 +1,40 @@
+import json
+from datetime import datetime, timedelta
+
+from app import db
+from app.export import json_chunks, ndjson_chunks, post_rows, report_progress
+from app.models import Post, User
+
+
+def test_post_rows_in_timestamp_order(client):
+    user = User(username="u", email="u@example.com")
+    other = User(username="o", email="o@example.com")
+    start = datetime(2024, 1, 1)
+    db.session.add_all([user, other])
+    db.session.add_all(
+        [Post(body=f"post {i}", author=user,
+              timestamp=start + timedelta(minutes=i % 3)) for i in range(7)] +
+        [Post(body="other", author=other, timestamp=start)])
+    db.session.commit()
+
+    rows = list(post_rows(user.id, batch_size=2))
+    assert [row["body"] for row in rows] == [
+        "post 0", "post 3", "post 6", "post 1", "post 4", "post 2", "post 5"]
+    assert rows[0]["timestamp"] == "2024-01-01T00:00:00Z"
+
+    assert json.loads("".join(json_chunks(rows))) == {"posts": rows}
+    assert json.loads("".join(json_chunks([]))) == {"posts": []}
+    assert [json.loads(line) for line in
+            "".join(ndjson_chunks(rows)).splitlines()] == rows
+
+
+def test_report_progress_is_throttled():
+    reported = []
+    rows = list(report_progress(range(1000), 1000, reported.append,
+                                interval=0))
+    assert rows == list(range(1000))
+    assert reported == list(range(1, 100))
+
+    reported = []
+    list(report_progress(range(1000), 1000, reported.append, interval=60))
+    assert reported == []
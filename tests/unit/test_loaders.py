@@ -0,0 +1,32 @@
+import sqlalchemy as sa
+
+from app import db
+from app.loaders import load_authors
+from app.models import Post, User
+
+
+def test_load_authors_resolves_authors_in_one_query(app, client):
+    users = [User(username=f"u{i}", email=f"u{i}@example.com")
+             for i in range(5)]
+    db.session.add_all(users)
+    db.session.add_all([Post(body=f"post {i}", author=users[i % 5])
+                        for i in range(20)])
+    db.session.commit()
+    db.session.expunge_all()
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.test_request_context():
+        posts = db.session.scalars(sa.select(Post)).all()
+        sa.event.listen(db.engine, "before_cursor_execute", count)
+        try:
+            load_authors(posts)
+            usernames = {post.author.username for post in posts}
+        finally:
+            sa.event.remove(db.engine, "before_cursor_execute", count)
+
+    assert usernames == {f"u{i}" for i in range(5)}
+    assert len(statements) == 1
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta, timezone
+from time import time
+
+import sqlalchemy as sa
+
+from app import db
+from app.maintenance import run_maintenance, schedule_maintenance
+from app.models import Notification, Task, User
+
+
+class FakeRegistry:
+    def __init__(self):
+        self.job_ids = []
+
+    def get_job_ids(self):
+        return list(self.job_ids)
+
+
+class FakeQueue:
+    def __init__(self):
+        self.scheduled_job_registry = FakeRegistry()
+
+    def enqueue_in(self, delay, name, job_id):
+        self.scheduled_job_registry.job_ids.append(job_id)
+        return job_id
+
+
+def test_maintenance_job_schedules_the_next_run(app, monkeypatch):
+    queue = FakeQueue()
+    monkeypatch.setattr(app, "task_queue", queue)
+
+    first = schedule_maintenance()
+    assert queue.scheduled_job_registry.job_ids == [first]
+    assert schedule_maintenance() is None
+
+    # the scheduler moves the job to the queue, and the running job then
+    # schedules the next run under a new id
+    queue.scheduled_job_registry.job_ids = []
+    second = schedule_maintenance()
+    assert queue.scheduled_job_registry.job_ids == [second]
+    assert second != first
+
+
+def test_run_maintenance_removes_expired_rows(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, "MAINTENANCE_BATCH_SIZE", 2)
+    monkeypatch.setitem(app.config, "NOTIFICATION_RETENTION",
+                        {"task_progress": 100})
+    monkeypatch.setitem(app.config, "NOTIFICATION_RETENTION_DEFAULT", 1000)
+    monkeypatch.setitem(app.config, "TASK_RETENTION", 1000)
+    user = User(username="u", email="u@example.com")
+    now = datetime.now(timezone.utc)
+    db.session.add(user)
+    db.session.add_all(
+        [Notification(name="task_progress", user=user, payload_json="{}",
+                      timestamp=time() - 500) for i in range(3)] +
+        [Notification(name="task_progress", user=user, payload_json="{}",
+                      timestamp=time()),
+         Notification(name="unread_message_count", user=user,
+                      payload_json="0", timestamp=time() - 500),
+         Notification(name="unread_message_count", user=user,
+                      payload_json="0", timestamp=time() - 5000)] +
+        [Task(id=str(i), name="export_posts", user=user, complete=True,
+              completed_at=now - timedelta(seconds=5000)) for i in range(3)] +
+        [Task(id="recent", name="export_posts", user=user, complete=True,
+              completed_at=now),
+         Task(id="running", name="export_posts", user=user)])
+    db.session.commit()
+
+    assert run_maintenance() == {"notifications": 4, "tasks": 3}
+    assert db.session.scalar(sa.select(sa.func.count(Notification.id))) == 2
+    assert db.session.scalars(sa.select(Task.id).order_by(Task.id)).all() \
+        == ["recent", "running"]
+    assert run_maintenance() == {"notifications": 0, "tasks": 0}
@@ -0,0 +1,110 @@
+import json
+
+from app import db
+from app.models import User
+from app.notifications import RedisNotificationStore, event_stream
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+
+    def publish(self, channel, message):
+        self.redis.published.append((channel, json.loads(message)))
+
+    def hset(self, key, field, value):
+        self.redis.hashes.setdefault(key, {})[field] = value
+
+    def expire(self, key, timeout):
+        pass
+
+    def execute(self):
+        pass
+
+
+class FakeRedis:
+    def __init__(self):
+        self.published = []
+        self.hashes = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def hvals(self, key):
+        return list(self.hashes.get(key, {}).values())
+
+
+class FakePubSub:
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.closed = False
+
+    def get_message(self, timeout):
+        return self.messages.pop(0) if self.messages else None
+
+    def close(self):
+        self.closed = True
+
+
+def test_notifications_are_published_after_commit(app, client, monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(app, "redis", fake)
+    user = User(username="u", email="u@example.com")
+    db.session.add(user)
+    db.session.commit()
+
+    user.add_notification("unread_message_count", 3)
+    assert fake.published == []
+    db.session.commit()
+    assert len(fake.published) == 1
+    channel, notification = fake.published[0]
+    assert channel == f"notifications:{user.id}"
+    assert notification["name"] == "unread_message_count"
+    assert notification["data"] == 3
+
+    user.add_notification("unread_message_count", 4)
+    db.session.rollback()
+    db.session.commit()
+    assert len(fake.published) == 1
+
+
+def test_event_stream():
+    pubsub = FakePubSub([
+        None,
+        {"type": "message", "data": json.dumps(
+            {"name": "task_progress", "data": {"progress": 50},
+             "timestamp": 2.5})},
+    ])
+    backlog = [{"name": "unread_message_count", "data": 1, "timestamp": 1.5}]
+    events = list(event_stream(pubsub, backlog, timeout=0.05, keepalive=0))
+
+    assert events[0] == 'id: 1.5\ndata: {"name": "unread_message_count", ' \
+        '"data": 1, "timestamp": 1.5}\n\n'
+    assert events[1] == ": keepalive\n\n"
+    assert events[2].startswith("id: 2.5\ndata: ")
+    assert set(events[3:]) == {": keepalive\n\n"}
+    assert pubsub.closed
+
+
+def test_redis_store_keeps_latest_per_name(app, client, monkeypatch):
+    fake = FakeRedis()
+    store = RedisNotificationStore(fake, 60)
+    monkeypatch.setattr(app, "redis", fake)
+    monkeypatch.setattr(app, "notification_store", store)
+    user = User(username="u", email="u@example.com")
+    db.session.add(user)
+    db.session.commit()
+
+    user.add_notification("unread_message_count", 1)
+    assert store.since(user.id, 0) == []
+    db.session.commit()
+    user.add_notification("task_progress", {"progress": 10})
+    user.add_notification("unread_message_count", 2)
+    db.session.commit()
+
+    notifications = store.since(user.id, 0)
+    assert [(n["name"], n["data"]) for n in notifications] == [
+        ("task_progress", {"progress": 10}), ("unread_message_count", 2)]
+    assert store.since(user.id, notifications[0]["timestamp"]) == \
+        notifications[1:]
+    assert db.session.scalar(user.notifications.select()) is None
@@ -0,0 +1,38 @@
+from datetime import timezone
+from time import time
+
+from app import db
+from app.models import User
+from app.presence import MemoryPresence, flush_last_seen
+
+
+def test_memory_presence_buffers_until_interval():
+    presence = MemoryPresence()
+    presence.record(1, time())
+    presence.record(2, time())
+    assert presence.pop_pending(60) == {}
+
+    presence.last_flush -= 60
+    pending = presence.pop_pending(60)
+    assert set(pending) == {1, 2}
+    assert presence.pop_pending(0) == {}
+
+
+def test_memory_presence_active_since():
+    presence = MemoryPresence()
+    now = time()
+    presence.record(1, now - 600)
+    presence.record(2, now - 10)
+    presence.record(3, now - 5)
+    assert presence.active_since(now - 300, 10) == [3, 2]
+    assert presence.active_since(now - 300, 1) == [3]
+    assert presence.last_activity(1) is None
+
+
+def test_flush_last_seen_updates_users(client, user):
+    timestamp = time() + 3600
+    flush_last_seen({user.id: timestamp})
+    db.session.expire_all()
+    last_seen = db.session.get(User, user.id).last_seen
+    assert abs(last_seen.replace(tzinfo=timezone.utc).timestamp() -
+               timestamp) < 1
@@ -0,0 +1,324 @@
+import json
+
+import sqlalchemy as sa
+
+from app import db
+from app.models import Post, User
+from app.cache import MemoryCache
+from app.search import DEAD_LETTER_KEY, QUEUE_KEY, ElasticsearchBackend, \
+    bulk_operations, coalesce_changes, id_ranges, process_queue, \
+    query_index, refresh_query
+
+
+def test_coalesce_changes_keeps_last_operation():
+    entries = [
+        {"index": "post", "id": 1, "op": "index"},
+        {"index": "post", "id": 2, "op": "index", "attempts": 2},
+        {"index": "post", "id": 1, "op": "delete"},
+        {"index": "post", "id": 2, "op": "index"},
+    ]
+    assert coalesce_changes(entries) == [
+        {"index": "post", "id": 1, "op": "delete", "attempts": 0},
+        {"index": "post", "id": 2, "op": "index", "attempts": 2},
+    ]
+
+
+def test_bulk_operations(client):
+    user = User(username="u", email="u@example.com")
+    post = Post(body="hello", author=user)
+    db.session.add_all([user, post])
+    db.session.commit()
+
+    operations = bulk_operations([
+        {"index": "post", "id": post.id, "op": "index"},
+        {"index": "post", "id": post.id + 1, "op": "index"},
+        {"index": "post", "id": post.id + 2, "op": "delete"},
+    ])
+    assert operations == [
+        {"index": {"_index": "post", "_id": post.id}},
+        {"body": "hello"},
+        {"delete": {"_index": "post", "_id": post.id + 1}},
+        {"delete": {"_index": "post", "_id": post.id + 2}},
+    ]
+
+
+class FakeQueueRedis:
+    def __init__(self):
+        self.lists = {}
+
+    def pipeline(self):
+        return FakeQueuePipeline(self)
+
+    def rpush(self, key, *values):
+        self.lists.setdefault(key, []).extend(values)
+
+    def delete(self, key):
+        self.lists.pop(key, None)
+
+    def hget(self, key, field):
+        return None
+
+    def entries(self, key):
+        return [json.loads(value) for value in self.lists.get(key, [])]
+
+
+class FakeQueuePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.results = []
+
+    def lrange(self, key, start, end):
+        self.results.append(self.redis.lists.get(key, [])[start:end + 1])
+
+    def ltrim(self, key, start, end):
+        self.redis.lists[key] = self.redis.lists.get(key, [])[start:]
+        self.results.append(True)
+
+    def execute(self):
+        return self.results
+
+
+class FakeBulkElasticsearch:
+    def __init__(self, failing_ids):
+        self.failing_ids = failing_ids
+
+    def bulk(self, operations):
+        items = []
+        for operation in operations:
+            if "index" not in operation and "delete" not in operation:
+                continue
+            op, action = next(iter(operation.items()))
+            if action["_id"] in self.failing_ids:
+                items.append({op: {"status": 429, "error": {
+                    "type": "es_rejected_execution_exception"}}})
+            else:
+                items.append({op: {"status": 200}})
+        return {"errors": any("error" in next(iter(item.values()))
+                              for item in items), "items": items}
+
+
+class FakeTaskQueue:
+    def __init__(self):
+        self.scheduled = []
+
+    def enqueue_in(self, delay, name):
+        self.scheduled.append(name)
+
+
+def test_process_queue_retries_and_dead_letters(app, client, monkeypatch):
+    user = User(username="u", email="u@example.com")
+    posts = [Post(body="hello", author=user), Post(body="bye", author=user)]
+    db.session.add_all([user] + posts)
+    db.session.commit()
+    ok, failing = posts[0].id, posts[1].id
+    fake_redis = FakeQueueRedis()
+    task_queue = FakeTaskQueue()
+    monkeypatch.setitem(app.config, "SEARCH_INDEX_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(app, "redis", fake_redis)
+    monkeypatch.setattr(app, "task_queue", task_queue)
+    monkeypatch.setattr(app, "elasticsearch",
+                        FakeBulkElasticsearch({failing}))
+    fake_redis.rpush(QUEUE_KEY, *[
+        json.dumps({"index": "post", "id": id, "op": "index"})
+        for id in (ok, failing)])
+
+    assert process_queue() == 1
+    assert fake_redis.entries(QUEUE_KEY) == [
+        {"index": "post", "id": failing, "op": "index", "attempts": 1}]
+    assert fake_redis.entries(DEAD_LETTER_KEY) == []
+    assert task_queue.scheduled == ["app.tasks.process_search_queue"]
+
+    assert process_queue() == 0
+    assert fake_redis.entries(QUEUE_KEY) == []
+    dead = fake_redis.entries(DEAD_LETTER_KEY)
+    assert [(entry["id"], entry["attempts"]) for entry in dead] == \
+        [(failing, 2)]
+    assert "es_rejected_execution_exception" in dead[0]["error"]
+    assert len(task_queue.scheduled) == 1
+
+
+def test_id_ranges_cover_all_rows(client):
+    assert id_ranges(Post, 4) == []
+
+    user = User(username="u", email="u@example.com")
+    db.session.add(user)
+    db.session.add_all([Post(body=f"post {i}", author=user)
+                        for i in range(10)])
+    db.session.commit()
+    ranges = id_ranges(Post, 3)
+    assert len(ranges) == 3
+    ids = [id for start, end in ranges for id in range(start, end)]
+    assert ids == list(range(1, 11))
+
+
+def test_database_search_ranks_matches(client):
+    user = User(username="u", email="u@example.com")
+    db.session.add_all([
+        Post(body="the cat sat on the mat", author=user),
+        Post(body="a dog and a cat and another cat", author=user),
+        Post(body="nothing to see here", author=user),
+    ])
+    db.session.commit()
+
+    posts, total = Post.search("cat", 1, 10)
+    assert total == 2
+    assert [p.body for p in posts] == ["a dog and a cat and another cat",
+                                       "the cat sat on the mat"]
+    posts, total = Post.search('dog "OR" -mat*', 1, 10)
+    assert total == 2
+    posts, total = Post.search("!!", 1, 10)
+    assert total == 0
+
+
+def test_database_search_follows_changes(client):
+    user = User(username="u", email="u@example.com")
+    post = Post(body="first version", author=user)
+    db.session.add_all([user, post])
+    db.session.commit()
+
+    post.body = "second version"
+    db.session.commit()
+    assert Post.search("first", 1, 10)[1] == 0
+    assert Post.search("second", 1, 10)[1] == 1
+
+    db.session.delete(post)
+    db.session.commit()
+    assert Post.search("second", 1, 10)[1] == 0
+
+
+def test_database_search_reindex(client):
+    user = User(username="u", email="u@example.com")
+    db.session.add(user)
+    db.session.add_all([Post(body=f"post {i}", author=user)
+                        for i in range(5)])
+    db.session.commit()
+    db.session.execute(sa.text("DELETE FROM post_fts"))
+    db.session.commit()
+    assert Post.search("post", 1, 10)[1] == 0
+
+    assert Post.reindex() == 5
+    assert Post.search("post", 1, 10)[1] == 5
+
+
+class FakeElasticsearch:
+    def __init__(self, documents):
+        # documents are (score, source) pairs
+        self.documents = documents
+
+    def search(self, index, query, sort, size, search_after=None):
+        reverse = sort[0]["_score"] == "desc"
+        hits = sorted(([score, source["id"]], source)
+                      for score, source in self.documents)
+        if reverse:
+            hits.reverse()
+        if search_after is not None:
+            hits = [hit for hit in hits if (hit[0] < search_after if reverse
+                                            else hit[0] > search_after)]
+        return {"hits": {
+            "total": {"value": len(self.documents)},
+            "hits": [{"_id": str(source["id"]), "sort": key, "_source": source}
+                     for key, source in hits[:size]]}}
+
+
+def test_search_document_round_trip(client):
+    user = User(username="u", email="U@example.com")
+    post = Post(body="hello", author=user, language="en")
+    db.session.add_all([user, post])
+    db.session.commit()
+
+    document = dict(body=post.body, **post.search_document())
+    result = Post.from_search_document(document)
+    assert result.id == post.id
+    assert result.body == "hello"
+    assert result.language == "en"
+    assert result.timestamp == post.timestamp
+    assert result.author.username == "u"
+    assert result.author.avatar(70) == user.avatar(70)
+
+
+def test_search_page_uses_search_after(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, "SEARCH_STORE_DOCUMENTS", True)
+    monkeypatch.setattr(app, "search_backend", ElasticsearchBackend())
+    monkeypatch.setattr(app, "elasticsearch", FakeElasticsearch([
+        (1.0 + (i % 2), {"id": i, "body": f"post {i}", "language": None,
+                         "timestamp": "2024-01-01T00:00:00",
+                         "username": "u", "avatar_hash": "0"})
+        for i in range(1, 6)]))
+
+    page = Post.search_page("post", 2)
+    assert [p.id for p in page.items] == [5, 3]
+    assert page.total == 5
+    assert not page.has_prev
+    page = Post.search_page("post", 2, **page.next_args)
+    assert [p.id for p in page.items] == [1, 4]
+    page = Post.search_page("post", 2, **page.next_args)
+    assert [p.id for p in page.items] == [2]
+    assert not page.has_next
+    page = Post.search_page("post", 2, **page.prev_args)
+    assert [p.id for p in page.items] == [1, 4]
+    assert page.has_prev
+
+
+def test_search_results_are_cached_until_the_index_changes(app, client,
+                                                           monkeypatch):
+    monkeypatch.setattr(app, "cache", MemoryCache())
+    queries = []
+    backend_query = app.search_backend.query
+
+    def query(*args):
+        queries.append(args)
+        return backend_query(*args)
+
+    monkeypatch.setattr(app.search_backend, "query", query)
+    user = User(username="u", email="u@example.com")
+    db.session.add_all([user, Post(body="hello world", author=user)])
+    db.session.commit()
+
+    assert query_index("post", "hello", 1, 10)[1] == 1
+    assert query_index("post", "hello", 1, 10)[1] == 1
+    assert len(queries) == 1
+    assert query_index("post", "hello", 2, 10) == ([], 1)
+    assert len(queries) == 2
+
+    db.session.add(Post(body="hello again", author=user))
+    db.session.commit()
+    assert query_index("post", "hello", 1, 10)[1] == 2
+    assert len(queries) == 3
+
+
+def test_refresh_query_replaces_cached_results(app, client, monkeypatch):
+    monkeypatch.setattr(app, "cache", MemoryCache())
+    user = User(username="u", email="u@example.com")
+    db.session.add_all([user, Post(body="hello world", author=user)])
+    db.session.commit()
+    assert query_index("post", "hello", 1, 10)[1] == 1
+
+    # a write that does not go through the session is only picked up by
+    # a refresh
+    db.session.execute(sa.text("DELETE FROM post_fts"))
+    db.session.commit()
+    assert query_index("post", "hello", 1, 10)[1] == 1
+    assert refresh_query("post", "hello", 1, 10) == ([], 0)
+    assert query_index("post", "hello", 1, 10) == ([], 0)
+
+
+class FailingRedis:
+    def __getattr__(self, name):
+        raise AssertionError(f"redis.{name} should not be used")
+
+
+def test_stale_results_refreshed_inline_without_shared_cache(app, client,
+                                                              monkeypatch):
+    monkeypatch.setitem(app.config, "CACHE_TYPE", "memory")
+    monkeypatch.setitem(app.config, "SEARCH_CACHE_REFRESH_AFTER", -1)
+    monkeypatch.setattr(app, "cache", MemoryCache())
+    monkeypatch.setattr(app, "redis", FailingRedis())
+    monkeypatch.setattr(app, "task_queue", FailingRedis())
+    user = User(username="u", email="u@example.com")
+    db.session.add_all([user, Post(body="hello world", author=user)])
+    db.session.commit()
+    assert query_index("post", "hello", 1, 10)[1] == 1
+
+    db.session.execute(sa.text("DELETE FROM post_fts"))
+    db.session.commit()
+    assert query_index("post", "hello", 1, 10) == ([], 0)
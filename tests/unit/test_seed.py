@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+from app import db
+from app.models import Message, Post, User, followers, timeline
+from app.seed import seed_data
+
+END = datetime(2024, 1, 1)
+START = END - timedelta(days=30)
+
+
+def _dataset():
+    # the password hashes are salted, so they differ between runs
+    return [
+        db.session.execute(sa.select(User.id, User.username, User.about_me,
+                                     User.last_seen).order_by(User.id)).all(),
+        db.session.execute(sa.select(followers).order_by(
+            followers.c.follower_id, followers.c.followed_id)).all(),
+        db.session.execute(sa.select(Post.__table__).order_by(
+            Post.id)).all(),
+        db.session.execute(sa.select(Message.__table__).order_by(
+            Message.id)).all(),
+    ]
+
+
+def test_seed_data_inserts_rows(client):
+    counts = seed_data(20, 200, 50, 5, 1.0, START, END, seed=1,
+                       batch_size=16)
+
+    assert counts["users"] == 20
+    assert counts["posts"] == 200
+    assert counts["messages"] == 50
+    assert db.session.scalar(sa.select(sa.func.count()).select_from(
+        followers)) == counts["follows"]
+    assert db.session.scalar(sa.select(sa.func.count()).where(
+        followers.c.follower_id == followers.c.followed_id)) == 0
+    timestamps = db.session.scalars(
+        sa.select(Post.timestamp).order_by(Post.id)).all()
+    assert timestamps == sorted(timestamps)
+    assert START <= timestamps[0] and timestamps[-1] <= END
+    assert db.session.scalar(sa.select(sa.func.count()).where(
+        Message.sender_id == Message.recipient_id)) == 0
+
+    User.rebuild_timelines()
+    User.reconcile_counters()
+    db.session.commit()
+    user = db.session.get(User, db.session.scalar(
+        sa.select(followers.c.followed_id)))
+    assert user.followers_count() == db.session.scalar(
+        sa.select(sa.func.count()).where(followers.c.followed_id == user.id))
+    assert db.session.scalar(sa.select(sa.func.count()).select_from(
+        timeline)) >= counts["posts"]
+
+
+def test_seed_data_is_deterministic(client):
+    seed_data(10, 50, 10, 3, 1.0, START, END, seed=7)
+    first = _dataset()
+    for table in (Message.__table__, Post.__table__, followers,
+                  User.__table__):
+        db.session.execute(table.delete())
+    db.session.commit()
+
+    seed_data(10, 50, 10, 3, 1.0, START, END, seed=7)
+    assert _dataset() == first
+    assert first[2]
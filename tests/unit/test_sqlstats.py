@@ -0,0 +1,52 @@
+import pytest
+import sqlalchemy as sa
+
+from app import create_app, db
+from app.sqlstats import QueryStats, max_queries, statement_shape
+from tests.conftest import TestConfig
+
+
+def test_statement_shape_ignores_parameters():
+    assert statement_shape("SELECT * FROM user WHERE id IN (?, ?, ?)") == \
+        statement_shape("SELECT * FROM user WHERE id IN (?)")
+    assert statement_shape("SELECT * FROM user WHERE name = 'a' LIMIT 5") == \
+        statement_shape("SELECT * FROM user WHERE name = 'b' LIMIT 10")
+
+
+def test_repeated_statements_are_reported():
+    stats = QueryStats()
+    for i in range(5):
+        stats.record(f"SELECT * FROM post WHERE user_id = {i}", 0.001)
+    stats.record("SELECT * FROM user", 0.001)
+    assert stats.repeated(5) == {"SELECT * FROM post WHERE user_id = ?": 5}
+    assert stats.count == 6
+
+
+def test_max_queries_fails_over_budget(client):
+    with pytest.raises(AssertionError):
+        with max_queries(1):
+            db.session.execute(sa.text("SELECT 1"))
+            db.session.execute(sa.text("SELECT 2"))
+
+
+def test_failed_statements_do_not_skew_timings(client):
+    with max_queries(1) as stats:
+        with pytest.raises(sa.exc.OperationalError):
+            db.session.execute(sa.text("SELECT * FROM missing"))
+        db.session.rollback()
+        db.session.execute(sa.text("SELECT 1"))
+    assert stats.statements == ["SELECT 1"]
+    assert 0 <= stats.duration < 1
+
+
+def test_query_count_header():
+    class StatsConfig(TestConfig):
+        SQL_QUERY_STATS = True
+
+    app = create_app(StatsConfig)
+    with app.app_context():
+        db.create_all()
+        response = app.test_client().get("/auth/login")
+        db.session.remove()
+        db.drop_all()
+    assert response.headers["X-SQL-Query-Count"] == "0"
@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta
+
+import requests
+import sqlalchemy as sa
+
+from app import db
+from app import translate as translate_module
+from app.cache import MemoryCache
+from app.models import Translation
+from app.translate import cached_translations, prune_translations, \
+    translate, translate_batch, translation_key
+
+
+class FakeResponse:
+    def __init__(self, texts, status_code=200):
+        self.texts = texts
+        self.status_code = status_code
+
+    def json(self):
+        return [{"translations": [{"text": text.upper()}]}
+                for text in self.texts]
+
+
+class FakeSession:
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+        self.calls = []
+
+    def post(self, url, headers, json, timeout):
+        self.calls.append(json)
+        return FakeResponse([item["Text"] for item in json],
+                            self.status_code)
+
+
+def test_translations_are_cached(app, client, monkeypatch):
+    session = FakeSession()
+    monkeypatch.setitem(app.config, "MS_TRANSLATOR_KEY", "key")
+    monkeypatch.setattr(translate_module, "_get_session", lambda: session)
+
+    assert translate("hola", "es", "en") == "HOLA"
+    assert translate("hola", "es", "en") == "HOLA"
+    assert len(session.calls) == 1
+    assert translate("hola", "es", "fr") == "HOLA"
+    assert len(session.calls) == 2
+    assert db.session.scalar(sa.select(sa.func.count(Translation.key))) == 2
+
+    # the front cache answers without going to the database
+    monkeypatch.setattr(app, "cache", MemoryCache())
+    assert translate("hola", "es", "en") == "HOLA"
+    db.session.execute(sa.delete(Translation))
+    db.session.commit()
+    assert translate("hola", "es", "en") == "HOLA"
+    assert len(session.calls) == 2
+
+
+def test_failed_translations_are_not_cached(app, client, monkeypatch):
+    session = FakeSession(status_code=500)
+    monkeypatch.setitem(app.config, "MS_TRANSLATOR_KEY", "key")
+    monkeypatch.setattr(translate_module, "_get_session", lambda: session)
+
+    with app.test_request_context():
+        assert translate("hola", "es", "en") == \
+            "Error: the translation service failed."
+    assert db.session.scalar(sa.select(sa.func.count(Translation.key))) == 0
+
+
+def test_prune_translations_keeps_most_recently_used(client):
+    now = datetime(2024, 1, 1)
+    db.session.add_all([Translation(key=str(i), source_language="es",
+                                    dest_language="en", text=str(i),
+                                    last_used=now + timedelta(minutes=i))
+                        for i in range(5)])
+    db.session.commit()
+
+    assert prune_translations(3) == 2
+    assert db.session.scalars(sa.select(Translation.key).order_by(
+        Translation.key)).all() == ["2", "3", "4"]
+    assert prune_translations(3) == 0
+
+
+def test_front_cache_hits_update_last_used(app, client, monkeypatch):
+    session = FakeSession()
+    monkeypatch.setitem(app.config, "MS_TRANSLATOR_KEY", "key")
+    monkeypatch.setattr(translate_module, "_get_session", lambda: session)
+    monkeypatch.setattr(app, "cache", MemoryCache())
+    assert translate("hola", "es", "en") == "HOLA"
+    key = translation_key("hola", "es", "en")
+    old = datetime(2024, 1, 1)
+    db.session.execute(sa.update(Translation).values(last_used=old))
+    db.session.commit()
+
+    # a recent use was already recorded, so the hit does not write
+    assert cached_translations([key]) == {key: "HOLA"}
+    assert db.session.get(Translation, key).last_used == old
+
+    monkeypatch.setitem(app.config, "TRANSLATION_TOUCH_INTERVAL", -1)
+    assert cached_translations([key]) == {key: "HOLA"}
+    db.session.expire_all()
+    assert db.session.get(Translation, key).last_used > old
+    assert len(session.calls) == 1
+
+
+def test_translate_batch_groups_and_deduplicates(app, client, monkeypatch):
+    session = FakeSession()
+    monkeypatch.setitem(app.config, "MS_TRANSLATOR_KEY", "key")
+    monkeypatch.setitem(app.config, "TRANSLATOR_BATCH_SIZE", 2)
+    monkeypatch.setattr(translate_module, "_get_session", lambda: session)
+    assert translate("uno", "es", "en") == "UNO"
+
+    result = translate_batch([
+        {"id": 1, "text": "uno", "source": "es", "dest": "en"},
+        {"id": 2, "text": "dos", "source": "es", "dest": "en"},
+        {"id": 3, "text": "dos", "source": "es", "dest": "en"},
+        {"id": 4, "text": "tres", "source": "es", "dest": "en"},
+        {"id": 5, "text": "cuatro", "source": "es", "dest": "en"},
+        {"id": 6, "text": "un", "source": "fr", "dest": "en"},
+    ])
+    assert result == ({1: "UNO", 2: "DOS", 3: "DOS", 4: "TRES",
+                       5: "CUATRO", 6: "UN"}, {})
+    # "uno" was cached, the three other spanish texts take two requests
+    assert sorted(len(call) for call in session.calls) == [1, 1, 1, 2]
+    assert translate("cuatro", "es", "en") == "CUATRO"
+    assert len(session.calls) == 4
+
+
+def test_translate_batch_reports_failed_groups(app, client, monkeypatch):
+    session = FakeSession()
+    monkeypatch.setitem(app.config, "MS_TRANSLATOR_KEY", "key")
+    monkeypatch.setattr(translate_module, "_get_session", lambda: session)
+    post_texts = translate_module._post_texts
+
+    def failing_french(session, api_key, timeout, texts, source, dest):
+        if source == "fr":
+            raise requests.ConnectionError()
+        return post_texts(session, api_key, timeout, texts, source, dest)
+
+    monkeypatch.setattr(translate_module, "_post_texts", failing_french)
+    with app.test_request_context():
+        result = translate_batch([
+            {"id": 1, "text": "uno", "source": "es", "dest": "en"},
+            {"id": 2, "text": "un", "source": "fr", "dest": "en"},
+        ])
+    assert result == ({1: "UNO"},
+                      {2: "Error: the translation service failed."})
@@ -0,0 +1,64 @@
+import sqlalchemy as sa
+
+from app import db
+from app.cache import MemoryCache
+from app.models import User
+from app.sqlstats import track_queries
+
+
+def test_get_cached_user_from_snapshot(app, client, user, monkeypatch):
+    monkeypatch.setattr(app, "cache", MemoryCache())
+    user_id = user.id
+    db.session.expunge_all()
+
+    with track_queries() as stats:
+        assert User.get_cached(user_id).username == "testuser"
+    assert stats.count == 1
+    db.session.expunge_all()
+
+    with track_queries() as stats:
+        cached = User.get_cached(user_id)
+        assert cached.username == "testuser"
+        assert cached.unread_message_count() == 0
+    assert stats.count == 0
+
+    # columns left out of the snapshot are loaded on demand
+    assert cached.check_password("TestPass2024!")
+
+
+def test_get_cached_user_invalidated_on_commit(app, client, user,
+                                               monkeypatch):
+    monkeypatch.setattr(app, "cache", MemoryCache())
+    user_id = user.id
+    User.get_cached(user_id)
+    db.session.expunge_all()
+
+    cached = User.get_cached(user_id)
+    cached.about_me = "updated"
+    db.session.commit()
+    db.session.expunge_all()
+
+    with track_queries() as stats:
+        assert User.get_cached(user_id).about_me == "updated"
+    assert stats.count == 1
+
+
+def test_mark_messages_read_on_stale_snapshot(app, client, user,
+                                              monkeypatch):
+    monkeypatch.setattr(app, "cache", MemoryCache())
+    user_id = user.id
+    db.session.expunge_all()
+    User.get_cached(user_id)
+    # a write that does not go through the session leaves the snapshot
+    # behind the database
+    db.session.execute(sa.update(User.__table__).where(
+        User.__table__.c.id == user_id).values(unread_messages=3))
+    db.session.commit()
+    db.session.expunge_all()
+
+    cached = User.get_cached(user_id)
+    assert cached.unread_message_count() == 0
+    cached.mark_messages_read()
+    db.session.commit()
+    assert db.session.scalar(sa.select(User.unread_messages).where(
+        User.id == user_id)) == 0